@@ -0,0 +1,28 @@
+import argparse
+import asyncio
+import json
+
+from config import config
+from main import build_evaluators
+from evaluator import BatchedAspectEvaluator, MultiEvaluator, measure_agreement
+
+
+async def main(cases_file: str):
+    with open(cases_file, 'r') as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    async with MultiEvaluator(build_evaluators(config)) as per_aspect, \
+            BatchedAspectEvaluator(api_key=config['env']['OPENAI_API_KEY'],
+                                   model=config['llm']['evaluator_model']['name'],
+                                   evaluation_aspects=config['evaluation']['aspects']) as batched:
+        report = await measure_agreement(batched, per_aspect, cases)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare batched aspect scores against the per-aspect evaluators.")
+    parser.add_argument("cases", help="JSONL file with system_prompt, user_input, current_output "
+                                      "and optional previous_output per line")
+    args = parser.parse_args()
+    asyncio.run(main(args.cases))
@@ -0,0 +1,110 @@
+import asyncio
+import random
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+REVISION_MARKER = re.compile(r'\[revision (\d+)\]')
+
+
+def constant_latency(seconds: float) -> Callable[[], float]:
+    return lambda: seconds
+
+
+def uniform_latency(low: float, high: float, rng: Optional[random.Random] = None) -> Callable[[], float]:
+    rng = rng or random.Random()
+    return lambda: rng.uniform(low, high)
+
+
+def lognormal_latency(median: float, sigma: float, rng: Optional[random.Random] = None) -> Callable[[], float]:
+    rng = rng or random.Random()
+    return lambda: rng.lognormvariate(0.0, sigma) * median
+
+
+def parse_latency(spec: str, rng: Optional[random.Random] = None) -> Callable[[], float]:
+    kind, *args = spec.split(":")
+    values = [float(arg) for arg in args]
+    if kind == "constant":
+        return constant_latency(*values)
+    if kind == "uniform":
+        return uniform_latency(*values, rng=rng)
+    if kind == "lognormal":
+        return lognormal_latency(*values, rng=rng)
+    raise ValueError(f"Unknown latency distribution: {spec} (use constant:S, uniform:LOW:HIGH or lognormal:MEDIAN:SIGMA)")
+
+
+def revision_number(text: str) -> int:
+    matches = REVISION_MARKER.findall(text)
+    return int(matches[-1]) if matches else 0
+
+
+def scripted_reviser_reply(messages: Sequence[BaseMessage]) -> str:
+    system = str(messages[0].content) if messages else ""
+    conversation = "\n".join(str(message.content) for message in messages[1:])
+    if "content reviewer" in system:
+        return "Tighten the wording and cover the missing requirement."
+
+    current = conversation.split("Current Output:", 1)[-1]
+    revision = revision_number(current) + 1
+    # Each revision uses different wording so similarity-based stopping does not end runs early
+    body = " ".join(f"step-{revision}-{index}" for index in range(12))
+    return ("SUGGESTIONS:\nMODIFY: vague wording -> specific wording\n\n"
+            f"REVISED OUTPUT:\nRevised task description: {body} [revision {revision}]\n"
+            "END OF REVISED OUTPUT")
+
+
+def scripted_evaluator_reply(trajectory: Sequence[int],
+                             aspect_offsets: Optional[Dict[str, int]] = None) -> Callable[[Dict[str, Any]], str]:
+    aspect_offsets = aspect_offsets or {}
+
+    def reply(payload: Dict[str, Any]) -> str:
+        system = payload["messages"][0]["content"]
+        user = payload["messages"][-1]["content"]
+        current = user.split("Current Output:", 1)[-1].split("Previous Output", 1)[0]
+        score = trajectory[min(revision_number(current), len(trajectory) - 1)]
+        offset = next((value for aspect, value in aspect_offsets.items() if f"focusing on {aspect}" in system), 0)
+        return f"Score: {max(0, min(100, score + offset))}\nReasoning: Scripted score for this revision."
+
+    return reply
+
+
+class FakeChatModel(BaseChatModel):
+    reply: Callable[[Sequence[BaseMessage]], str] = scripted_reviser_reply
+    latency: Callable[[], float] = constant_latency(0.0)
+    model_name: str = "fake-chat"
+    calls: int = 0
+    simulated_seconds: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        content = self.reply(messages)
+        prompt_tokens = sum(len(str(message.content)) for message in messages) // 4
+        message = AIMessage(content=content, usage_metadata={
+            "input_tokens": prompt_tokens,
+            "output_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _next_latency(self) -> float:
+        delay = self.latency()
+        self.calls += 1
+        self.simulated_seconds += delay
+        return delay
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                  **kwargs: Any) -> ChatResult:
+        time.sleep(self._next_latency())
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                         **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self._next_latency())
+        return self._result(messages)
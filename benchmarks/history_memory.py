@@ -0,0 +1,119 @@
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from typing import Any, Dict, List, Tuple
+
+from history_store import HistoryLog, RevisionHistory
+from output_handler import render_structured_entry
+
+WORDS = ("the", "task", "should", "describe", "clear", "steps", "for", "engineer", "review", "service", "deploy",
+         "config", "metrics", "owner", "deadline", "scope", "risk", "test", "rollout", "document")
+
+
+def make_line(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)) + "."
+
+
+def make_run(run: int, lines: int, iterations: int, edit_fraction: float) -> Tuple[List[str], List[Dict[str, Any]]]:
+    rng = random.Random(run)
+    document = [make_line(rng, rng.randint(6, 18)) for _ in range(lines)]
+    texts = ["\n".join(document)]
+    log = []
+    for iteration in range(1, iterations + 1):
+        # A model revision re-emits the whole document with a fraction of its lines reworded
+        for _ in range(max(1, int(lines * edit_fraction))):
+            document[rng.randrange(len(document))] = make_line(rng, rng.randint(6, 18))
+        revised = "\n".join(document)
+        reasoning = {aspect: make_line(rng, 40) for aspect in ("relevance", "coherence", "accuracy", "simplicity")}
+        log.append({
+            "iteration": iteration,
+            "evaluation": {
+                "overall_score": 80.0,
+                "aspect_scores": {aspect: 80.0 for aspect in reasoning},
+                "combined_reasoning": "\n\n".join(f"{aspect} Reasoning: {text}" for aspect, text in reasoning.items()),
+                "failed_aspects": [],
+                "aspect_reasoning": reasoning,
+                "aspect_sources": {}
+            },
+            "feedback": make_line(rng, 60),
+            "suggestions": [make_line(rng, 10) for _ in range(3)],
+            "revised_output": revised
+        })
+        texts.append(revised)
+    return texts, log
+
+
+def measure(runs: int, build) -> Tuple[List[Any], int]:
+    gc.collect()
+    tracemalloc.start()
+    kept = [build(run) for run in range(runs)]
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return kept, size
+
+
+def time_build(runs: int, build) -> float:
+    # Timed separately because tracemalloc slows down every allocation
+    start = time.perf_counter()
+    for run in range(runs):
+        build(run)
+    return time.perf_counter() - start
+
+
+def main(args: argparse.Namespace):
+    def plain(run: int):
+        return make_run(run, args.lines, args.iterations, args.edit_fraction)
+
+    def compact(run: int):
+        texts, log = make_run(run, args.lines, args.iterations, args.edit_fraction)
+        history = RevisionHistory(texts, args.checkpoint_every)
+        return history, HistoryLog(log, history, args.checkpoint_every)
+
+    plain_kept, plain_bytes = measure(args.runs, plain)
+    del plain_kept
+    compact_kept, compact_bytes = measure(args.runs, compact)
+    plain_seconds = time_build(args.runs, plain)
+    compact_seconds = time_build(args.runs, compact)
+
+    # Rendering every entry is what output_handler does, so it shows the cost of materializing on access
+    start = time.perf_counter()
+    for history, log in compact_kept:
+        for entry in log:
+            render_structured_entry(entry)
+        assert history[0] and history[-1]
+    materialize_seconds = time.perf_counter() - start
+
+    report = {
+        "settings": vars(args),
+        "plain_bytes_per_run": plain_bytes / args.runs,
+        "compact_bytes_per_run": compact_bytes / args.runs,
+        "reduction": 1 - compact_bytes / plain_bytes,
+        "plain_build_seconds": plain_seconds,
+        "compact_build_seconds": compact_seconds,
+        "materialize_all_seconds": materialize_seconds
+    }
+    print(f"Plain history:   {report['plain_bytes_per_run'] / 1024:9.1f} KiB per run")
+    print(f"Compact history: {report['compact_bytes_per_run'] / 1024:9.1f} KiB per run "
+          f"({report['reduction']:.0%} smaller)")
+    print(f"Build time:      {plain_seconds:.2f}s plain, {compact_seconds:.2f}s compact; "
+          f"rendering every entry took {materialize_seconds:.2f}s")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the memory held by plain and delta-compressed revision "
+                                                 "histories.")
+    parser.add_argument("--runs", type=int, default=1000, help="Finished runs kept in memory, as the service does")
+    parser.add_argument("--lines", type=int, default=200, help="Lines per document")
+    parser.add_argument("--iterations", type=int, default=6)
+    parser.add_argument("--edit-fraction", type=float, default=0.1, help="Fraction of lines reworded per revision")
+    parser.add_argument("--checkpoint-every", type=int, default=8)
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    main(parser.parse_args())
@@ -0,0 +1,43 @@
+import argparse
+import asyncio
+import time
+
+from benchmarks.stub_server import StubLLMServer
+from evaluator import OpenAIEvaluator
+from http_client import HTTPClientPool
+
+
+async def run_evaluations(evaluator: OpenAIEvaluator, total: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await evaluator.evaluate("system prompt", "user input", "current output")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return total / (time.perf_counter() - start)
+
+
+async def main(total: int, concurrency: int):
+    async with StubLLMServer() as server:
+        unpooled = OpenAIEvaluator(api_key="stub", model="stub", evaluation_aspect="relevance",
+                                   api_base=server.url)
+        unpooled_rps = await run_evaluations(unpooled, total, concurrency)
+
+        async with HTTPClientPool() as pool:
+            pooled = OpenAIEvaluator(api_key="stub", model="stub", evaluation_aspect="relevance",
+                                     api_base=server.url, http_pool=pool)
+            pooled_rps = await run_evaluations(pooled, total, concurrency)
+
+    print(f"Session per call: {unpooled_rps:8.1f} req/s")
+    print(f"Pooled session:   {pooled_rps:8.1f} req/s")
+    print(f"Speedup:          {pooled_rps / unpooled_rps:8.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-call aiohttp sessions with the shared pool.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
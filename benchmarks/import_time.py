@@ -0,0 +1,66 @@
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+DEFAULT_FORBIDDEN = ["langchain_openai", "langchain_anthropic", "openai", "anthropic"]
+
+
+def measure_import(module: str) -> Dict[str, Tuple[int, int]]:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True
+    )
+    timings = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def top_level(timings: Dict[str, Tuple[int, int]]) -> Dict[str, int]:
+    totals: Dict[str, int] = {}
+    for name, (self_us, _) in timings.items():
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0) + self_us
+    return totals
+
+
+def main(module: str, runs: int, top: int, max_ms: float, forbidden: List[str]) -> int:
+    samples = []
+    timings = {}
+    for _ in range(runs):
+        timings = measure_import(module)
+        samples.append(timings[module][1] / 1000)
+
+    median_ms = statistics.median(samples)
+    print(f"import {module}: median {median_ms:.1f} ms over {runs} run(s) (min {min(samples):.1f}, max {max(samples):.1f})")
+    print("Heaviest packages (last run):")
+    for package, self_us in sorted(top_level(timings).items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {package:<30} {self_us / 1000:8.1f} ms")
+
+    failed = False
+    loaded = [name for name in forbidden if name in timings]
+    if loaded:
+        print(f"FAIL: {module} eagerly imports {', '.join(loaded)}")
+        failed = True
+    if max_ms and median_ms > max_ms:
+        print(f"FAIL: median import time {median_ms:.1f} ms exceeds budget of {max_ms:.1f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure CLI import time with -X importtime and catch regressions.")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, default=0,
+                        help="Fail when the median import time exceeds this many milliseconds")
+    parser.add_argument("--forbid", nargs="*", default=DEFAULT_FORBIDDEN,
+                        help="Modules that must not be imported at startup")
+    args = parser.parse_args()
+    sys.exit(main(args.module, args.runs, args.top, args.max_ms, args.forbid))
@@ -0,0 +1,169 @@
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from benchmarks.fakes import FakeChatModel, parse_latency, scripted_evaluator_reply
+from benchmarks.stub_server import StubLLMServer
+from config import config
+from evaluator import MultiEvaluator, OpenAIEvaluator
+from hedging import AlternateModel, Hedger
+from http_client import HTTPClientPool
+from instrumentation import instrumentation
+from reviser import Reviser, RevisionInput
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def seeded_latency(spec: str, seed: int, source: str) -> Callable[[], float]:
+    # One generator per latency source, so interleaving between concurrent calls does not change the draws
+    return parse_latency(spec, random.Random(f"{seed}:{source}"))
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "mean": statistics.fmean(ordered),
+        **{f"p{q}": ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))] for q in (50, 95, 99)},
+        "max": ordered[-1]
+    }
+
+
+async def run_jobs(jobs: int, server: StubLLMServer, args: argparse.Namespace) -> Dict[str, Any]:
+    agent_llm = FakeChatModel(latency=seeded_latency(args.llm_latency, args.seed, "agent"), model_name="fake-agent")
+    reviser_llm = FakeChatModel(latency=seeded_latency(args.llm_latency, args.seed, "reviser"),
+                                model_name="fake-reviser")
+    hedger = None
+    alternate_agent = alternate_reviser = None
+    if args.hedge:
+        # The configured minimum delay is tuned for real providers and would hide hedging at simulated latencies
+        hedger = Hedger(min_delay=0.0)
+        alternate_agent = AlternateModel(
+            FakeChatModel(latency=seeded_latency(args.alternate_latency, args.seed, "alternate-agent"),
+                          model_name="fake-alternate-agent"), "alternate")
+        alternate_reviser = AlternateModel(
+            FakeChatModel(latency=seeded_latency(args.alternate_latency, args.seed, "alternate-reviser"),
+                          model_name="fake-alternate-reviser"), "alternate")
+    requests_before = server.request_count
+    rss_before = peak_rss_mb()
+
+    async with HTTPClientPool(limit=args.http_limit, limit_per_host=args.http_limit) as pool:
+        evaluators = [
+            OpenAIEvaluator(api_key="stub", model="stub", evaluation_aspect=aspect, api_base=server.url)
+            for aspect in config['evaluation']['aspects']
+        ]
+        async with MultiEvaluator(evaluators, http_pool=pool, hedger=hedger) as evaluator:
+            reviser = Reviser(agent_llm, reviser_llm, evaluator, max_iterations=args.max_iterations, hedger=hedger,
+                              alternate_agent=alternate_agent, alternate_reviser=alternate_reviser)
+            latencies: List[float] = []
+            stop_reasons: Dict[str, int] = {}
+
+            async def one(index: int):
+                start = time.perf_counter()
+                result = await reviser.revise(RevisionInput(
+                    system_prompt="Write a concise task description for a new engineer.",
+                    user_input=f"Benchmark job {index}",
+                    initial_output="A vague task description. [revision 0]"
+                ))
+                latencies.append(time.perf_counter() - start)
+                stop_reasons[result.stop_reason or "max_iterations"] = \
+                    stop_reasons.get(result.stop_reason or "max_iterations", 0) + 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one(index) for index in range(jobs)))
+            elapsed = time.perf_counter() - start
+
+    llm_calls = agent_llm.calls + reviser_llm.calls
+    if args.hedge:
+        llm_calls += alternate_agent.llm.calls + alternate_reviser.llm.calls
+    return {
+        "jobs": jobs,
+        "seconds": elapsed,
+        "throughput_jobs_per_second": jobs / elapsed,
+        "latency_seconds": percentiles(latencies),
+        "llm_calls": llm_calls,
+        "simulated_llm_seconds": agent_llm.simulated_seconds + reviser_llm.simulated_seconds,
+        "evaluator_requests": server.request_count - requests_before,
+        "stop_reasons": stop_reasons,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_growth_mb": peak_rss_mb() - rss_before,
+        "hedging": hedger.get_stats() if hedger else None
+    }
+
+
+async def main(args: argparse.Namespace):
+    # Per-iteration INFO logs of full outputs would dominate the measured overhead
+    logging.getLogger().setLevel(args.log_level)
+    if args.seed is None:
+        args.seed = random.randrange(2 ** 32)
+    print(f"Seed {args.seed}")
+    trajectory = [int(score) for score in args.trajectory.split(",")]
+    report: Dict[str, Any] = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "jobs": args.jobs,
+            "max_iterations": args.max_iterations,
+            "llm_latency": args.llm_latency,
+            "evaluator_latency": args.evaluator_latency,
+            "trajectory": trajectory,
+            "aspects": config['evaluation']['aspects'],
+            "target_score": config['reviser']['target_score'],
+            "http_limit": args.http_limit,
+            "hedge": args.hedge,
+            "alternate_latency": args.alternate_latency if args.hedge else None,
+            "log_level": args.log_level,
+            "seed": args.seed
+        },
+        "runs": []
+    }
+
+    async with StubLLMServer(reply=scripted_evaluator_reply(trajectory),
+                             latency=seeded_latency(args.evaluator_latency, args.seed, "evaluator")) as server:
+        for jobs in args.jobs:
+            instrumentation.reset()
+            run = await run_jobs(jobs, server, args)
+            run["stages"] = instrumentation.summary()
+            report["runs"].append(run)
+            latency = run["latency_seconds"]
+            print(f"{jobs:>6} jobs: {run['throughput_jobs_per_second']:9.1f} jobs/s, "
+                  f"p50 {latency['p50'] * 1000:8.1f} ms, p99 {latency['p99'] * 1000:8.1f} ms, "
+                  f"peak RSS {run['peak_rss_mb']:7.1f} MB")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Reviser.revise end-to-end against fake LLMs and a "
+                                                 "stub evaluator endpoint.")
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 100, 10000],
+                        help="Numbers of concurrent jobs to run, one benchmark run each")
+    parser.add_argument("--max-iterations", type=int, default=4)
+    parser.add_argument("--llm-latency", default="constant:0",
+                        help="Fake chat model latency: constant:S, uniform:LOW:HIGH or lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--evaluator-latency", default="constant:0", help="Stub evaluator endpoint latency")
+    parser.add_argument("--trajectory", default="60,75,85,95",
+                        help="Scripted evaluator scores for revision 0, 1, 2, ...")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Hedge slow calls, sending agent and reviser hedges to an alternate fake model")
+    parser.add_argument("--alternate-latency", default="constant:0", help="Alternate fake chat model latency")
+    parser.add_argument("--http-limit", type=int, default=config['http']['limit'])
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Seed for the simulated latencies; a random seed is picked and reported if omitted")
+    parser.add_argument("--output", default="benchmark_results.json")
+    asyncio.run(main(parser.parse_args()))
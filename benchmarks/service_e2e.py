@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any, Dict
+
+import aiohttp
+from aiohttp import web
+from langchain_openai import ChatOpenAI
+
+from benchmarks.stub_server import StubLLMServer, uniform_latency
+from config import config
+from evaluator import MultiEvaluator, OpenAIEvaluator
+from reviser import Reviser
+from service import RevisionService, create_app
+
+
+def stub_reply(payload: Dict[str, Any]) -> str:
+    system = payload["messages"][0]["content"]
+    if "content evaluator" in system:
+        return f"Score: {random.randint(70, 99)}\nReasoning: Stub evaluation."
+    if "content reviewer" in system:
+        return "The output should be more specific."
+    return "SUGGESTIONS:\nMODIFY: vague -> specific\n\nREVISED OUTPUT:\nA more specific output.\nEND OF REVISED OUTPUT"
+
+
+async def main(jobs: int, workers: int, max_latency: float):
+    async with StubLLMServer(reply=stub_reply, latency=uniform_latency(0.0, max_latency)) as server:
+        llm = ChatOpenAI(model="stub", api_key="stub", base_url=server.base_url, max_retries=0)
+        evaluators = [
+            OpenAIEvaluator(api_key="stub", model="stub", evaluation_aspect=aspect, api_base=server.url)
+            for aspect in config['evaluation']['aspects']
+        ]
+        async with MultiEvaluator(evaluators) as evaluator:
+            service = RevisionService(Reviser(llm, llm, evaluator), workers=workers, queue_size=jobs)
+            runner = web.AppRunner(create_app(service), access_log=None)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            base_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+            try:
+                async with aiohttp.ClientSession() as session:
+                    start = time.perf_counter()
+                    job_ids = []
+                    for index in range(jobs):
+                        async with session.post(f"{base_url}/jobs", json={
+                            "system_prompt": "Write a short task description.",
+                            "user_input": f"Task {index}",
+                            "initial_output": "A vague output.",
+                            "priority": index % 3
+                        }) as response:
+                            assert response.status == 202, await response.text()
+                            job_ids.append((await response.json())["job_id"])
+
+                    event_types = []
+                    async with session.get(f"{base_url}/jobs/{job_ids[-1]}/events") as response:
+                        async for line in response.content:
+                            event_types.append(json.loads(line)["type"])
+
+                    statuses = {}
+                    for job_id in job_ids:
+                        while True:
+                            async with session.get(f"{base_url}/jobs/{job_id}/result") as response:
+                                if response.status != 409:
+                                    statuses[response.status] = statuses.get(response.status, 0) + 1
+                                    break
+                            await asyncio.sleep(0.05)
+                    elapsed = time.perf_counter() - start
+
+                    async with session.get(f"{base_url}/health") as response:
+                        health = await response.json()
+            finally:
+                await runner.cleanup()
+
+    print(f"Jobs:             {jobs} ({statuses})")
+    print(f"Throughput:       {jobs / elapsed:8.1f} jobs/s with {workers} worker(s)")
+    print(f"LLM requests:     {server.request_count}")
+    print(f"Event stream:     {' -> '.join(event_types)}")
+    print(f"Health:           {health}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the revision service end-to-end against a stub LLM endpoint.")
+    parser.add_argument("--jobs", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--max-latency", type=float, default=0.05,
+                        help="Upper bound of the uniform stub latency in seconds")
+    args = parser.parse_args()
+    asyncio.run(main(args.jobs, args.workers, args.max_latency))
@@ -0,0 +1,78 @@
+import asyncio
+import random
+from typing import Callable, Dict, Any, Optional
+
+from aiohttp import web
+
+DEFAULT_REPLY = "Score: 80\nReasoning: Stub evaluation."
+
+
+class StubLLMServer:
+    def __init__(self,
+                 reply: Callable[[Dict[str, Any]], str] = lambda payload: DEFAULT_REPLY,
+                 latency: Callable[[], float] = lambda: 0.0,
+                 host: str = "127.0.0.1",
+                 port: int = 0):
+        self.reply = reply
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.request_count = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1/chat/completions"
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def _handle_chat_completion(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        self.request_count += 1
+        delay = self.latency()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        content = self.reply(payload)
+        return web.json_response({
+            "id": f"stub-{self.request_count}",
+            "object": "chat.completion",
+            "created": 0,
+            "model": payload.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": sum(len(str(m.get("content", ""))) // 4 for m in payload.get("messages", [])),
+                "completion_tokens": len(content) // 4,
+                "total_tokens": 0
+            }
+        })
+
+    async def start(self) -> "StubLLMServer":
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._handle_chat_completion)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "StubLLMServer":
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+
+def uniform_latency(low: float, high: float) -> Callable[[], float]:
+    return lambda: random.uniform(low, high)
@@ -0,0 +1,114 @@
+import asyncio
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Set
+
+from pydantic import BaseModel
+
+from config import config
+
+DEADLINE_REACHED = "Deadline reached"
+TOKEN_BUDGET_EXHAUSTED = "Token budget exhausted"
+COST_BUDGET_EXHAUSTED = "Cost budget exhausted"
+BUDGET_STOP_REASONS = (DEADLINE_REACHED, TOKEN_BUDGET_EXHAUSTED, COST_BUDGET_EXHAUSTED)
+
+logger = logging.getLogger(__name__)
+
+_unpriced_models: Set[str] = set()
+
+_current_tracker: contextvars.ContextVar[Optional["BudgetTracker"]] = contextvars.ContextVar("budget_tracker",
+                                                                                           default=None)
+
+
+class RunBudget(BaseModel):
+    timeout_seconds: Optional[float] = config['reviser']['budget']['timeout_seconds']
+    deadline: Optional[float] = None
+    max_tokens: Optional[int] = config['reviser']['budget']['max_tokens']
+    max_cost: Optional[float] = config['reviser']['budget']['max_cost']
+
+
+class BudgetUsage(BaseModel):
+    elapsed_seconds: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    cost: float = 0.0
+    timeout_seconds: Optional[float] = None
+    max_tokens: Optional[int] = None
+    max_cost: Optional[float] = None
+
+
+class BudgetTracker:
+    def __init__(self, budget: RunBudget, pricing: Optional[Dict[str, Dict[str, float]]] = None):
+        self.budget = budget
+        self.pricing = config['pricing'] if pricing is None else pricing
+        self.started = time.time()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.exhausted = asyncio.Event()
+
+    @property
+    def deadline(self) -> Optional[float]:
+        deadlines = [deadline for deadline in (
+            self.started + self.budget.timeout_seconds if self.budget.timeout_seconds is not None else None,
+            self.budget.deadline
+        ) if deadline is not None]
+        return min(deadlines) if deadlines else None
+
+    def remaining_seconds(self) -> Optional[float]:
+        deadline = self.deadline
+        return None if deadline is None else max(0.0, deadline - time.time())
+
+    def observe(self, model: str, prompt_tokens: int, completion_tokens: int):
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        prices = self.pricing.get(model)
+        if prices is None:
+            prices = {}
+            if self.budget.max_cost is not None and model not in _unpriced_models:
+                _unpriced_models.add(model)
+                logger.warning(f"No pricing configured for model {model}; its tokens do not count towards max_cost")
+        # Prices are per million tokens
+        self.cost += (prompt_tokens * prices.get('prompt', 0.0) + completion_tokens * prices.get('completion', 0.0)) \
+            / 1_000_000
+        if self.stop_reason() is not None:
+            self.exhausted.set()
+
+    def stop_reason(self) -> Optional[str]:
+        if self.budget.max_tokens is not None and self.prompt_tokens + self.completion_tokens >= self.budget.max_tokens:
+            return TOKEN_BUDGET_EXHAUSTED
+        if self.budget.max_cost is not None and self.cost >= self.budget.max_cost:
+            return COST_BUDGET_EXHAUSTED
+        if self.remaining_seconds() == 0.0:
+            return DEADLINE_REACHED
+        return None
+
+    def usage(self) -> BudgetUsage:
+        deadline = self.deadline
+        return BudgetUsage(
+            elapsed_seconds=time.time() - self.started,
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            total_tokens=self.prompt_tokens + self.completion_tokens,
+            cost=self.cost,
+            timeout_seconds=deadline - self.started if deadline is not None else None,
+            max_tokens=self.budget.max_tokens,
+            max_cost=self.budget.max_cost
+        )
+
+    @contextmanager
+    def activate(self) -> Iterator["BudgetTracker"]:
+        token = _current_tracker.set(self)
+        try:
+            yield self
+        finally:
+            _current_tracker.reset(token)
+
+
+def record_usage(model: str, prompt_tokens: int, completion_tokens: int):
+    tracker = _current_tracker.get()
+    if tracker is not None and (prompt_tokens or completion_tokens):
+        tracker.observe(model, prompt_tokens, completion_tokens)
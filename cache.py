@@ -0,0 +1,127 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(namespace: str, *parts: Any) -> str:
+    payload = json.dumps([namespace, *parts], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class MemoryCache:
+    def __init__(self, max_size: int, ttl_seconds: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created_at, value = entry
+        if self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, created_at: Optional[float] = None):
+        self._entries[key] = (created_at or time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    def __init__(self, path: str, ttl_seconds: Optional[float] = None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        row = self._connection.execute("SELECT value, created_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        if self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds:
+            self._connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._connection.commit()
+            return None
+        return created_at, json.loads(value)
+
+    def set(self, key: str, value: Any, created_at: Optional[float] = None):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO cache (key, value, created_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), created_at or time.time())
+        )
+        self._connection.commit()
+
+    def close(self):
+        self._connection.close()
+
+
+class ResultCache:
+    def __init__(self,
+                 max_size: int = config['cache']['max_size'],
+                 ttl_seconds: Optional[float] = config['cache']['ttl_seconds'],
+                 sqlite_path: Optional[str] = config['cache']['sqlite_path']):
+        self.memory = MemoryCache(max_size, ttl_seconds)
+        self.disk = SQLiteCache(sqlite_path, ttl_seconds) if sqlite_path else None
+        self.stats = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0}
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats["hits"] += 1
+            self.stats["memory_hits"] += 1
+            return value
+
+        if self.disk:
+            entry = self.disk.get(key)
+            if entry is not None:
+                created_at, value = entry
+                self.memory.set(key, value, created_at)
+                self.stats["hits"] += 1
+                self.stats["disk_hits"] += 1
+                return value
+
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, key: str, value: Any):
+        created_at = time.time()
+        self.memory.set(key, value, created_at)
+        if self.disk:
+            self.disk.set(key, value, created_at)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "hit_rate": self.hit_rate, "memory_size": len(self.memory)}
+
+    def close(self):
+        if self.disk:
+            self.disk.close()
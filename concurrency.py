@@ -0,0 +1,27 @@
+import asyncio
+from typing import Dict, Optional
+
+from config import config
+
+
+class _Unlimited:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+class ProviderLimiter:
+    def __init__(self, limits: Optional[Dict[str, int]] = None):
+        self.limits = config['batch']['provider_limits'] if limits is None else limits
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._unlimited = _Unlimited()
+
+    def slot(self, provider: str):
+        limit = self.limits.get(provider)
+        if not limit:
+            return self._unlimited
+        if provider not in self._semaphores:
+            self._semaphores[provider] = asyncio.Semaphore(limit)
+        return self._semaphores[provider]
@@ -1,16 +1,53 @@
 import os
-import yaml
-from dotenv import load_dotenv
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional
 
-load_dotenv()
+CONFIG_PATH = 'config/config.yaml'
 
-with open('config/config.yaml', 'r') as config_file:
-    yaml_config = yaml.safe_load(config_file)
 
-config = {
-    **yaml_config,
-    'env': {
-        'ANTHROPIC_API_KEY': os.getenv('ANTHROPIC_API_KEY'),
-        'OPENAI_API_KEY': os.getenv('OPENAI_API_KEY')
+def load_config(path: str = CONFIG_PATH) -> Dict[str, Any]:
+    import yaml
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    with open(path, 'r') as config_file:
+        yaml_config = yaml.safe_load(config_file)
+
+    return {
+        **yaml_config,
+        'env': {
+            'ANTHROPIC_API_KEY': os.getenv('ANTHROPIC_API_KEY'),
+            'OPENAI_API_KEY': os.getenv('OPENAI_API_KEY')
+        }
     }
-}
+
+
+class LazyConfig(Mapping):
+    def __init__(self, path: str = CONFIG_PATH):
+        self.path = path
+        self._data: Optional[Dict[str, Any]] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._data is not None
+
+    def _load(self) -> Dict[str, Any]:
+        if self._data is None:
+            self._data = load_config(self.path)
+        return self._data
+
+    def __getitem__(self, key: str) -> Any:
+        return self._load()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._load())
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def __repr__(self) -> str:
+        return repr(self._load()) if self.loaded else f"LazyConfig({self.path!r}, not loaded)"
+
+
+config = LazyConfig()
@@ -0,0 +1,125 @@
+import difflib
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import config
+from rate_limiter import estimate_tokens
+
+BUDGETED_FIELDS = ("current_output", "previous_output", "evaluation_combined_reasoning", "feedback")
+MIN_FIELD_TOKENS = 64
+
+_REASONING_SECTION = re.compile(r'\n\n(?=[^\n]+ Reasoning:\n)')
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def truncate_middle(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    marker = "\n[... ~{} tokens omitted to fit the context budget ...]\n"
+    keep_chars = max(0, max_tokens * 4 - len(marker) - 8)
+    head = text[:keep_chars * 2 // 3]
+    tail = text[len(text) - keep_chars // 3:] if keep_chars // 3 else ""
+    omitted = estimate_tokens(text[len(head):len(text) - len(tail)])
+    return head + marker.format(omitted) + tail
+
+
+def summarize_reasoning(reasoning: str, max_tokens: int) -> str:
+    if estimate_tokens(reasoning) <= max_tokens:
+        return reasoning
+    sections = _REASONING_SECTION.split(reasoning)
+    section_budget = max(1, max_tokens // len(sections))
+    return "\n\n".join(_summarize_section(section, section_budget) for section in sections)
+
+
+def _summarize_section(section: str, max_tokens: int) -> str:
+    if estimate_tokens(section) <= max_tokens:
+        return section
+    header, _, body = section.partition("\n") if " Reasoning:\n" in section else ("", "", section)
+    kept: List[str] = []
+    used = estimate_tokens(header)
+    for sentence in _SENTENCE_END.split(body.strip()):
+        cost = estimate_tokens(sentence)
+        if kept and used + cost > max_tokens:
+            break
+        kept.append(sentence)
+        used += cost
+    summary = truncate_middle(" ".join(kept), max(1, max_tokens - estimate_tokens(header)))
+    summary += " [...]"
+    return f"{header}\n{summary}" if header else summary
+
+
+def diff_outputs(previous_output: str, current_output: str) -> str:
+    if previous_output == current_output:
+        return "Identical to the current output."
+    diff = difflib.unified_diff(previous_output.splitlines(), current_output.splitlines(),
+                                "previous_output", "current_output", lineterm="", n=1)
+    return "Changes from the previous output to the current output (unified diff):\n" + "\n".join(diff)
+
+
+class ContextBudget:
+    def __init__(self,
+                 max_tokens: int = config['reviser']['context_budget']['max_tokens'],
+                 reasoning_tokens: int = config['reviser']['context_budget']['reasoning_tokens'],
+                 feedback_tokens: int = config['reviser']['context_budget']['feedback_tokens'],
+                 diff_previous_output: bool = config['reviser']['context_budget']['diff_previous_output']):
+        self.max_tokens = max_tokens
+        self.reasoning_tokens = reasoning_tokens
+        self.feedback_tokens = feedback_tokens
+        self.diff_previous_output = diff_previous_output
+
+    def measure(self, fields: Dict[str, Any], names: Iterable[str]) -> Dict[str, int]:
+        return {name: estimate_tokens(str(fields[name])) for name in names if name in fields}
+
+    def compact(self,
+                fields: Dict[str, Any],
+                names: Iterable[str] = BUDGETED_FIELDS,
+                protected: Iterable[str] = ()) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        names = [name for name in names if name in fields and isinstance(fields[name], str)]
+        tokens = self.measure(fields, names)
+        if sum(tokens.values()) <= self.max_tokens:
+            return fields, []
+
+        compacted = dict(fields)
+        records: List[Dict[str, Any]] = []
+        protected = set(protected)
+
+        def replace(name: str, action: str, value: str):
+            before = tokens[name]
+            after = estimate_tokens(value)
+            if after >= before:
+                return
+            compacted[name] = value
+            tokens[name] = after
+            records.append({"field": name, "action": action, "tokens_before": before, "tokens_after": after})
+
+        if self.diff_previous_output and "previous_output" in tokens and "current_output" in fields \
+                and "previous_output" not in protected:
+            replace("previous_output", "diff", diff_outputs(fields["previous_output"], fields["current_output"]))
+
+        if "evaluation_combined_reasoning" in tokens and "evaluation_combined_reasoning" not in protected:
+            replace("evaluation_combined_reasoning", "summarize",
+                    summarize_reasoning(compacted["evaluation_combined_reasoning"], self.reasoning_tokens))
+
+        if "feedback" in tokens and "feedback" not in protected:
+            replace("feedback", "truncate", truncate_middle(compacted["feedback"], self.feedback_tokens))
+
+        # Whatever is still over budget is cut from the largest fields first
+        for name in sorted((name for name in tokens if name not in protected), key=tokens.get, reverse=True):
+            over = sum(tokens.values()) - self.max_tokens
+            if over <= 0:
+                break
+            replace(name, "truncate", truncate_middle(compacted[name], max(MIN_FIELD_TOKENS, tokens[name] - over)))
+
+        return compacted, records
+
+
+def build_context_budget(settings: Optional[Dict[str, Any]] = None) -> Optional[ContextBudget]:
+    settings = config['reviser']['context_budget'] if settings is None else settings
+    if not settings.get('enabled'):
+        return None
+    return ContextBudget(
+        max_tokens=settings['max_tokens'],
+        reasoning_tokens=settings['reasoning_tokens'],
+        feedback_tokens=settings['feedback_tokens'],
+        diff_previous_output=settings['diff_previous_output']
+    )
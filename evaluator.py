@@ -1,14 +1,25 @@
+import json
 import logging
+import random
 import re
 
 import aiohttp
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, create_model
+from typing import List, Optional, Dict, Any, Tuple
 from statistics import mean
 import asyncio
 
+from cache import ResultCache, make_cache_key
+from concurrency import ProviderLimiter
 from config import config
-from prompts import EVALUATION_SYSTEM_PROMPTS, EVALUATION_USER_PROMPT
+from hedging import Hedger
+from http_client import HTTPClientPool
+from instrumentation import Span, instrumentation
+from rate_limiter import RateLimiter, RateLimitError, RetryableError, estimate_tokens, parse_retry_after
+from prompts import (EVALUATION_SYSTEM_PROMPTS, EVALUATION_USER_PROMPT, EVALUATION_ASPECT_CRITERIA,
+                     BATCHED_EVALUATION_SYSTEM_PROMPT, BATCHED_EVALUATION_USER_PROMPT, STABLE_CONTEXT_PROMPT,
+                     EVALUATION_JSON_FORMAT_PROMPT, REASK_PROMPT)
+from structured_output import ParseOutcome, parse_with_reasks
 
 
 class EvaluationResult(BaseModel):
@@ -28,15 +39,31 @@ class BaseEvaluator:
 
 
 class OpenAIEvaluator(BaseEvaluator):
+    provider = "openai"
+
     def __init__(self,
                  api_key: str,
                  model: str,
                  evaluation_aspect: str,
-                 api_base: str = "https://api.openai.com/v1/chat/completions"):
+                 api_base: str = "https://api.openai.com/v1/chat/completions",
+                 http_pool: Optional[HTTPClientPool] = None,
+                 cache: Optional[ResultCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 hedger: Optional[Hedger] = None,
+                 structured_output: bool = config['structured_output']['evaluation'],
+                 max_reasks: int = config['structured_output']['max_reasks'],
+                 reask_max_tokens: int = config['structured_output']['reask_max_tokens']):
         self.api_key = api_key
         self.model = model
         self.evaluation_aspect = evaluation_aspect
         self.api_base = api_base
+        self.http_pool = http_pool
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.hedger = hedger
+        self.structured_output = structured_output
+        self.max_reasks = max_reasks
+        self.reask_max_tokens = reask_max_tokens
         self.logger = logging.getLogger(__name__)
 
     async def evaluate(self,
@@ -46,47 +73,137 @@ class OpenAIEvaluator(BaseEvaluator):
                        previous_output: Optional[str] = None) -> EvaluationResult:
         evaluation_context = {
             "aspect": self.evaluation_aspect,
-            "system_prompt": system_prompt,
-            "user_input": user_input,
             "current_output": current_output,
             "previous_output": previous_output or "No previous output available."
         }
 
         user_prompt = EVALUATION_USER_PROMPT.format(**evaluation_context)
+        stable_context = STABLE_CONTEXT_PROMPT.format(system_prompt=system_prompt, user_input=user_input)
 
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                        self.api_base,
-                        headers={
-                            "Authorization": f"Bearer {self.api_key}",
-                            "Content-Type": "application/json"
-                        },
-                        json=self._prepare_api_request(user_prompt)
-                ) as response:
-                    result = await response.json()
-
-            response_text = result['choices'][0]['message']['content']
-            return await self.parse_evaluation_response(response_text)
-        except Exception as e:
-            self.logger.error(f"Error during evaluation: {str(e)}")
-            raise
+        payload = self._prepare_api_request(user_prompt, stable_context)
+        cache_key = make_cache_key("evaluation", self.api_base, payload) if self.cache else None
 
-    def _prepare_api_request(self, user_prompt: str) -> Dict[str, Any]:
-        return {
+        with instrumentation.span("evaluate", self.model) as span:
+            if cache_key:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    span.cache_hit = True
+                    return EvaluationResult(**cached)
+
+            try:
+                response_text = await self._complete(payload, span)
+                if self.structured_output:
+                    evaluation, parsed = await self._parse_structured(payload, response_text)
+                else:
+                    with instrumentation.span("parse", self.model) as parse_span:
+                        evaluation = await self.parse_evaluation_response(response_text, parse_span)
+                    parsed = not parse_span.parse_failures
+                # A fallback score would otherwise be served from the cache for its whole TTL
+                if cache_key and parsed:
+                    self.cache.set(cache_key, evaluation.model_dump())
+                return evaluation
+            except Exception as e:
+                self.logger.error(f"Error during evaluation: {str(e)}")
+                raise
+
+    async def _parse_structured(self, payload: Dict[str, Any], response_text: str) -> Tuple[EvaluationResult, bool]:
+        outcome = await parse_with_reasks(response_text, EvaluationResult, self._reasker(payload), self.max_reasks,
+                                          "evaluation", self.model)
+        if outcome.result is not None:
+            return outcome.result, True
+        reasoning = outcome.valid.get('reasoning', "Evaluation response could not be parsed.")
+        return EvaluationResult(score=outcome.valid.get('score', 0), reasoning=str(reasoning)), False
+
+    def _reasker(self, payload: Dict[str, Any]):
+        messages = list(payload['messages'])
+
+        async def reask(previous: str, fields: List[str], error: str) -> str:
+            # Only the malformed fields are asked for again, which keeps the retry far cheaper than a new iteration
+            messages.extend([
+                {"role": "assistant", "content": previous},
+                {"role": "user", "content": REASK_PROMPT.format(fields=", ".join(fields), error=error)}
+            ])
+            with instrumentation.span("reask", self.model) as span:
+                return await self._complete({**payload, "messages": list(messages),
+                                             "max_tokens": self.reask_max_tokens * len(fields)}, span, "reask")
+
+        return reask
+
+    async def _complete(self, payload: Dict[str, Any], span: Span, stage: str = "evaluate") -> str:
+        tokens = estimate_tokens("".join(message['content'] for message in payload['messages'])) + \
+            payload.get('max_tokens', 0)
+
+        async def call() -> Dict[str, Any]:
+            if self.rate_limiter:
+                return await self.rate_limiter.call(self.provider, self.model, lambda: self._post(payload), tokens,
+                                                    span)
+            return await self._post(payload)
+
+        if self.hedger:
+            # The evaluators only speak the chat completions API, so hedges duplicate the request to the same endpoint;
+            # a rate limiter has already retried transient failures, so the hedger does not retry them again
+            result = await self.hedger.call(stage, self.model, call, tokens=tokens,
+                                            retry_on_failure=self.rate_limiter is None)
+        else:
+            result = await call()
+        usage = result.get('usage') or {}
+        span.add_usage(usage.get('prompt_tokens', 0),
+                       usage.get('completion_tokens', 0),
+                       (usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0))
+        return result['choices'][0]['message']['content']
+
+    async def _post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        if self.http_pool:
+            session = await self.http_pool.get_session()
+            async with session.post(self.api_base, headers=headers, json=payload) as response:
+                return await self._read_response(response)
+
+        async with aiohttp.ClientSession() as session:
+            async with session.post(self.api_base, headers=headers, json=payload) as response:
+                return await self._read_response(response)
+
+    @staticmethod
+    async def _read_response(response: aiohttp.ClientResponse) -> Dict[str, Any]:
+        if response.status == 429:
+            raise RateLimitError(f"Rate limited by {response.url.host}", response.status,
+                                 parse_retry_after(response.headers.get('Retry-After')))
+        if response.status >= 500:
+            raise RetryableError(f"Server error {response.status} from {response.url.host}", response.status,
+                                 parse_retry_after(response.headers.get('Retry-After')))
+        response.raise_for_status()
+        return await response.json()
+
+    def _prepare_api_request(self, user_prompt: str, stable_context: str = "") -> Dict[str, Any]:
+        system_prompt = EVALUATION_SYSTEM_PROMPTS[self.evaluation_aspect]
+        if self.structured_output:
+            system_prompt += EVALUATION_JSON_FORMAT_PROMPT
+        payload = {
             "model": self.model,
             "messages": [
-                {"role": "system", "content": EVALUATION_SYSTEM_PROMPTS[self.evaluation_aspect]},
+                {"role": "system", "content": system_prompt + stable_context},
                 {"role": "user", "content": user_prompt}
             ],
             "temperature": config['openai']['temperature'],
             "max_tokens": config['openai']['max_tokens']
         }
+        if self.structured_output:
+            payload["response_format"] = {"type": "json_object"}
+        return payload
 
     @staticmethod
-    async def parse_evaluation_response(response_text: str) -> EvaluationResult:
+    async def parse_evaluation_response(response_text: str, span: Optional[Span] = None) -> EvaluationResult:
         score_match = re.search(r'(?i)score:?\s*(\d+)', response_text)
-        score = int(score_match.group(1)) if score_match else 0
+        if score_match:
+            score = int(score_match.group(1))
+        else:
+            logging.getLogger(__name__).warning("Evaluation response has no score; scoring it 0")
+            score = 0
+            if span:
+                span.parse_failures += 1
 
         reasoning_match = re.search(r'(?i)reasoning:?\s*(.*)', response_text, re.DOTALL)
         if reasoning_match:
@@ -104,34 +221,355 @@ class AggregatedEvaluationResult(BaseModel):
     overall_score: float
     aspect_scores: Dict[str, int]
     combined_reasoning: str
+    failed_aspects: List[str] = []
+    aspect_reasoning: Dict[str, str] = {}
+    aspect_sources: Dict[str, str] = {}
+
+
+def aggregate_evaluations(aspects: List[str], results: List[EvaluationResult]) -> AggregatedEvaluationResult:
+    aspect_scores = {aspect: result.score for aspect, result in zip(aspects, results)}
+    aspect_reasoning = {aspect: result.reasoning for aspect, result in zip(aspects, results)}
+    return _aggregate(aspect_scores, aspect_reasoning, {aspect: "fresh" for aspect in aspects})
+
+
+def _aggregate(aspect_scores: Dict[str, int],
+               aspect_reasoning: Dict[str, str],
+               aspect_sources: Dict[str, str]) -> AggregatedEvaluationResult:
+    overall_score = mean(aspect_scores.values())
+    combined_reasoning = "\n\n".join(
+        f"{aspect.capitalize()} Reasoning:\n{aspect_reasoning.get(aspect, '')}"
+        for aspect in aspect_scores
+    )
+
+    return AggregatedEvaluationResult(
+        overall_score=overall_score,
+        aspect_scores=aspect_scores,
+        combined_reasoning=combined_reasoning,
+        aspect_reasoning=aspect_reasoning,
+        aspect_sources=aspect_sources
+    )
+
+
+def merge_carried_aspects(fresh: AggregatedEvaluationResult,
+                          previous: Any,
+                          carried: List[str],
+                          aspects: List[str]) -> AggregatedEvaluationResult:
+    aspect_scores, aspect_reasoning, aspect_sources = {}, {}, {}
+    for aspect in aspects:
+        if aspect in carried:
+            aspect_scores[aspect] = previous.aspect_scores[aspect]
+            aspect_reasoning[aspect] = previous.aspect_reasoning.get(aspect, "")
+            aspect_sources[aspect] = "carried"
+        elif aspect in fresh.aspect_scores:
+            aspect_scores[aspect] = fresh.aspect_scores[aspect]
+            aspect_reasoning[aspect] = fresh.aspect_reasoning.get(aspect, "")
+            aspect_sources[aspect] = "fresh"
+
+    evaluation = _aggregate(aspect_scores, aspect_reasoning, aspect_sources)
+    evaluation.failed_aspects = fresh.failed_aspects
+    return evaluation
 
 
 class MultiEvaluator:
     def __init__(self,
-                 evaluators: List[OpenAIEvaluator]):
+                 evaluators: List[OpenAIEvaluator],
+                 http_pool: Optional[HTTPClientPool] = None,
+                 limiter: Optional[ProviderLimiter] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 hedger: Optional[Hedger] = None):
         self.evaluators = evaluators
+        self.limiter = limiter or ProviderLimiter()
+        self.rate_limiter = rate_limiter
+        self.hedger = hedger
+        self._owns_http_pool = http_pool is None
+        self.http_pool = http_pool or HTTPClientPool()
+        self.logger = logging.getLogger(__name__)
+        for evaluator in self.evaluators:
+            if getattr(evaluator, 'http_pool', False) is None:
+                evaluator.http_pool = self.http_pool
+            if getattr(evaluator, 'rate_limiter', False) is None:
+                evaluator.rate_limiter = self.rate_limiter
+            if getattr(evaluator, 'hedger', False) is None:
+                evaluator.hedger = self.hedger
+
+    async def close(self):
+        if self._owns_http_pool:
+            await self.http_pool.close()
+
+    async def __aenter__(self) -> "MultiEvaluator":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
 
     async def evaluate(self,
                        system_prompt: str,
                        user_input: str,
                        current_output: str,
                        previous_output: Optional[str] = None) -> AggregatedEvaluationResult:
+        return await self.evaluate_aspects(self.evaluation_aspects, system_prompt, user_input, current_output,
+                                           previous_output)
+
+    @property
+    def evaluation_aspects(self) -> List[str]:
+        return [evaluator.evaluation_aspect for evaluator in self.evaluators]
+
+    async def evaluate_aspects(self,
+                               aspects: List[str],
+                               system_prompt: str,
+                               user_input: str,
+                               current_output: str,
+                               previous_output: Optional[str] = None) -> AggregatedEvaluationResult:
+        evaluators = [evaluator for evaluator in self.evaluators if evaluator.evaluation_aspect in aspects]
         evaluation_tasks = [
-            evaluator.evaluate(system_prompt, user_input, current_output, previous_output)
-            for evaluator in self.evaluators
+            self._limited_evaluate(evaluator, system_prompt, user_input, current_output, previous_output)
+            for evaluator in evaluators
         ]
-        results = await asyncio.gather(*evaluation_tasks)
-
-        aspect_scores = {evaluator.evaluation_aspect: result.score for evaluator, result in
-                         zip(self.evaluators, results)}
-        overall_score = mean(aspect_scores.values())
-        combined_reasoning = "\n\n".join(
-            f"{evaluator.evaluation_aspect.capitalize()} Reasoning:\n{result.reasoning}"
-            for evaluator, result in zip(self.evaluators, results)
+        results = await asyncio.gather(*evaluation_tasks, return_exceptions=True)
+
+        # A single failing aspect is left out of the aggregate instead of failing the whole evaluation
+        aspects, succeeded, failed_aspects = [], [], []
+        for evaluator, result in zip(evaluators, results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, BaseException):
+                self.logger.error(f"Evaluation of {evaluator.evaluation_aspect} failed: {str(result)}")
+                failed_aspects.append(evaluator.evaluation_aspect)
+            else:
+                aspects.append(evaluator.evaluation_aspect)
+                succeeded.append(result)
+
+        if not succeeded:
+            raise next(result for result in results if isinstance(result, BaseException))
+
+        evaluation = aggregate_evaluations(aspects, succeeded)
+        evaluation.failed_aspects = failed_aspects
+        return evaluation
+
+    async def _limited_evaluate(self,
+                                evaluator: OpenAIEvaluator,
+                                system_prompt: str,
+                                user_input: str,
+                                current_output: str,
+                                previous_output: Optional[str]) -> EvaluationResult:
+        async with self.limiter.slot(evaluator.provider):
+            return await evaluator.evaluate(system_prompt, user_input, current_output, previous_output)
+
+
+class BatchedAspectEvaluator(OpenAIEvaluator):
+    def __init__(self,
+                 api_key: str,
+                 model: str,
+                 evaluation_aspects: List[str],
+                 api_base: str = "https://api.openai.com/v1/chat/completions",
+                 http_pool: Optional[HTTPClientPool] = None,
+                 cache: Optional[ResultCache] = None,
+                 limiter: Optional[ProviderLimiter] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 hedger: Optional[Hedger] = None,
+                 max_reasks: int = config['structured_output']['max_reasks'],
+                 reask_max_tokens: int = config['structured_output']['reask_max_tokens']):
+        # Batched evaluations always ask for JSON, so re-asks apply whether or not structured output is enabled
+        super().__init__(api_key, model, ", ".join(evaluation_aspects), api_base, http_pool, cache, rate_limiter,
+                         hedger, True, max_reasks, reask_max_tokens)
+        self.evaluation_aspects = evaluation_aspects
+        self.response_model = create_model("BatchedEvaluation",
+                                           **{aspect: (EvaluationResult, ...) for aspect in evaluation_aspects})
+        self.limiter = limiter or ProviderLimiter()
+        self._owns_http_pool = http_pool is None
+        self.http_pool = http_pool or HTTPClientPool()
+        self.system_prompt = BATCHED_EVALUATION_SYSTEM_PROMPT.format(aspect_criteria="\n".join(
+            f"- {aspect}: {EVALUATION_ASPECT_CRITERIA.get(aspect, aspect)}" for aspect in evaluation_aspects
+        ))
+
+    async def close(self):
+        if self._owns_http_pool:
+            await self.http_pool.close()
+
+    async def __aenter__(self) -> "BatchedAspectEvaluator":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def evaluate(self,
+                       system_prompt: str,
+                       user_input: str,
+                       current_output: str,
+                       previous_output: Optional[str] = None) -> AggregatedEvaluationResult:
+        user_prompt = BATCHED_EVALUATION_USER_PROMPT.format(
+            aspects=", ".join(self.evaluation_aspects),
+            current_output=current_output,
+            previous_output=previous_output or "No previous output available."
         )
+        stable_context = STABLE_CONTEXT_PROMPT.format(system_prompt=system_prompt, user_input=user_input)
 
-        return AggregatedEvaluationResult(
-            overall_score=overall_score,
-            aspect_scores=aspect_scores,
-            combined_reasoning=combined_reasoning
+        payload = self._prepare_api_request(user_prompt, stable_context)
+        cache_key = make_cache_key("batched_evaluation", self.api_base, payload) if self.cache else None
+
+        with instrumentation.span("evaluate", self.model) as span:
+            if cache_key:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    span.cache_hit = True
+                    return AggregatedEvaluationResult(**cached)
+
+            try:
+                async with self.limiter.slot(self.provider):
+                    response_text = await self._complete(payload, span)
+                outcome = await parse_with_reasks(response_text, self.response_model, self._reasker(payload),
+                                                  self.max_reasks, "batched_evaluation", self.model)
+                results = self._results_from(outcome)
+            except Exception as e:
+                self.logger.error(f"Error during batched evaluation: {str(e)}")
+                raise
+
+        evaluation = aggregate_evaluations(self.evaluation_aspects, results)
+        if cache_key and outcome.result is not None:
+            self.cache.set(cache_key, evaluation.model_dump())
+        return evaluation
+
+    def _prepare_api_request(self, user_prompt: str, stable_context: str = "") -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": self.system_prompt + stable_context},
+                {"role": "user", "content": user_prompt}
+            ],
+            "temperature": config['openai']['temperature'],
+            "max_tokens": config['openai']['max_tokens'] * len(self.evaluation_aspects),
+            "response_format": {"type": "json_object"}
+        }
+
+    def _results_from(self, outcome: ParseOutcome) -> List[EvaluationResult]:
+        if outcome.result is not None:
+            return [getattr(outcome.result, aspect) for aspect in self.evaluation_aspects]
+        # Aspects that validated in any reply are kept; the rest fall back to a score of 0
+        return self._results_from_data(outcome.valid, self.evaluation_aspects)
+
+    def parse_batched_response(self, response_text: str, aspects: List[str]) -> List[EvaluationResult]:
+        return self._results_from_data(json.loads(response_text), aspects)
+
+    def _results_from_data(self, data: Dict[str, Any], aspects: List[str]) -> List[EvaluationResult]:
+        results = []
+        for aspect in aspects:
+            aspect_data = data.get(aspect)
+            if not isinstance(aspect_data, dict) or 'score' not in aspect_data:
+                self.logger.warning(f"Batched evaluation response has no score for {aspect}")
+                results.append(EvaluationResult(score=0, reasoning=f"No evaluation returned for {aspect}."))
+                continue
+            results.append(EvaluationResult(score=int(aspect_data['score']),
+                                            reasoning=str(aspect_data.get('reasoning', '')).strip()))
+        return results
+
+
+class CascadeEvaluator:
+    def __init__(self,
+                 screen: Any,
+                 full: Any,
+                 target_score: float = config['reviser']['target_score'],
+                 escalation_margin: float = config['evaluation']['cascade']['escalation_margin'],
+                 audit_rate: float = config['evaluation']['cascade']['audit_rate']):
+        self.screen = screen
+        self.full = full
+        self.target_score = target_score
+        self.escalation_margin = escalation_margin
+        self.audit_rate = audit_rate
+        self.logger = logging.getLogger(__name__)
+        self.stats = {
+            "screened": 0,
+            "escalated": 0,
+            "audited": 0,
+            "screen_failures": 0,
+            "compared": 0,
+            "decisions_agree": 0,
+            "absolute_difference": 0.0
+        }
+
+    async def close(self):
+        for evaluator in (self.screen, self.full):
+            if hasattr(evaluator, 'close'):
+                await evaluator.close()
+
+    async def __aenter__(self) -> "CascadeEvaluator":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def evaluate(self,
+                       system_prompt: str,
+                       user_input: str,
+                       current_output: str,
+                       previous_output: Optional[str] = None) -> AggregatedEvaluationResult:
+        try:
+            with instrumentation.span("screen"):
+                screen_result = await self.screen.evaluate(system_prompt, user_input, current_output, previous_output)
+        except Exception as e:
+            self.logger.warning(f"Screening evaluation failed, escalating to the full evaluators: {str(e)}")
+            self.stats["screen_failures"] += 1
+            return await self.full.evaluate(system_prompt, user_input, current_output, previous_output)
+
+        near_target = screen_result.overall_score >= self.target_score - self.escalation_margin
+        uncertain = near_target or bool(getattr(screen_result, 'failed_aspects', None))
+        # A sample of clearly-below-target outputs is still sent to the full evaluators to keep measuring agreement
+        audit = not uncertain and random.random() < self.audit_rate
+        if not uncertain and not audit:
+            self.stats["screened"] += 1
+            # Tagged so that screen scores are not weighed against full evaluations when picking or stopping
+            return screen_result.model_copy(update={
+                "aspect_sources": {aspect: "screen" for aspect in screen_result.aspect_scores}
+            })
+
+        self.stats["escalated" if uncertain else "audited"] += 1
+        full_result = await self.full.evaluate(system_prompt, user_input, current_output, previous_output)
+        self._record_agreement(screen_result, full_result)
+        return full_result
+
+    def _record_agreement(self, screen_result: AggregatedEvaluationResult, full_result: AggregatedEvaluationResult):
+        difference = abs(screen_result.overall_score - full_result.overall_score)
+        agrees = (screen_result.overall_score >= self.target_score) == (full_result.overall_score >= self.target_score)
+        self.stats["compared"] += 1
+        self.stats["decisions_agree"] += int(agrees)
+        self.stats["absolute_difference"] += difference
+        self.logger.info(f"Evaluator cascade: screen scored {screen_result.overall_score:.1f}, full evaluators "
+                         f"{full_result.overall_score:.1f} (difference {difference:.1f}, "
+                         f"target decision {'agrees' if agrees else 'disagrees'})")
+
+    def get_stats(self) -> Dict[str, Any]:
+        evaluations = self.stats["screened"] + self.stats["escalated"] + self.stats["audited"] + \
+            self.stats["screen_failures"]
+        compared = self.stats["compared"]
+        return {
+            **self.stats,
+            "screened_fraction": self.stats["screened"] / evaluations if evaluations else 0.0,
+            "mean_absolute_difference": self.stats["absolute_difference"] / compared if compared else 0.0,
+            "target_decision_agreement": self.stats["decisions_agree"] / compared if compared else 0.0
+        }
+
+
+async def measure_agreement(candidate: Any,
+                            reference: Any,
+                            cases: List[Dict[str, Any]],
+                            target_score: float = config['reviser']['target_score']) -> Dict[str, Any]:
+    differences: Dict[str, List[float]] = {}
+    decisions_agree = 0
+    for case in cases:
+        candidate_result, reference_result = await asyncio.gather(
+            candidate.evaluate(case['system_prompt'], case['user_input'], case['current_output'],
+                               case.get('previous_output')),
+            reference.evaluate(case['system_prompt'], case['user_input'], case['current_output'],
+                               case.get('previous_output'))
         )
+        for aspect, score in reference_result.aspect_scores.items():
+            if aspect in candidate_result.aspect_scores:
+                differences.setdefault(aspect, []).append(abs(candidate_result.aspect_scores[aspect] - score))
+        if (candidate_result.overall_score >= target_score) == (reference_result.overall_score >= target_score):
+            decisions_agree += 1
+
+    return {
+        "cases": len(cases),
+        "mean_absolute_difference": {aspect: mean(values) for aspect, values in differences.items()},
+        "max_absolute_difference": {aspect: max(values) for aspect, values in differences.items()},
+        "target_decision_agreement": decisions_agree / len(cases) if cases else 0.0
+    }
@@ -0,0 +1,252 @@
+import asyncio
+import contextvars
+import logging
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from config import config
+from rate_limiter import is_retryable
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_run_budget: contextvars.ContextVar[Optional["HedgeBudget"]] = contextvars.ContextVar("hedge_run_budget",
+                                                                                       default=None)
+
+
+class AlternateModel:
+    def __init__(self, llm: Any, provider: str):
+        self.llm = llm
+        self.provider = provider
+
+
+class HedgeBudget:
+    def __init__(self, max_hedges: int):
+        self.max_hedges = max_hedges
+        self.used = 0
+
+    def try_acquire(self) -> bool:
+        if self.used >= self.max_hedges:
+            return False
+        self.used += 1
+        return True
+
+
+class HedgeMetrics:
+    def __init__(self, window: int):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.holdout_samples: Deque[float] = deque(maxlen=window)
+        self.primary_samples: Deque[float] = deque(maxlen=window)
+        self.calls = 0
+        self.holdout_calls = 0
+        self.hedged = 0
+        self.failovers = 0
+        self.backup_wins = 0
+        self.budget_denied = 0
+        self.extra_requests = 0
+        self.extra_estimated_tokens = 0
+
+    def observe(self, seconds: float, holdout: bool, primary_seconds: Optional[float] = None):
+        self.calls += 1
+        if holdout:
+            self.holdout_calls += 1
+            self.holdout_samples.append(seconds)
+        else:
+            self.samples.append(seconds)
+            if primary_seconds is not None:
+                self.primary_samples.append(primary_seconds)
+
+    def quantile(self, q: float, holdout: bool = False) -> Optional[float]:
+        samples = self.holdout_samples if holdout else self.samples
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> Dict[str, Any]:
+        hedged_p99 = self.quantile(0.99)
+        holdout_p99 = self.quantile(0.99, holdout=True)
+        hedge_eligible = self.calls - self.holdout_calls
+        return {
+            "calls": self.calls,
+            "holdout_calls": self.holdout_calls,
+            "hedged": self.hedged,
+            "failovers": self.failovers,
+            "backup_wins": self.backup_wins,
+            "budget_denied": self.budget_denied,
+            "extra_requests": self.extra_requests,
+            "extra_request_ratio": self.extra_requests / hedge_eligible if hedge_eligible else 0.0,
+            "extra_estimated_tokens": self.extra_estimated_tokens,
+            **{f"p{int(q * 100)}_seconds": self.quantile(q) for q in QUANTILES},
+            "holdout_p99_seconds": holdout_p99,
+            # Holdout calls are never hedged, so their tail is the latency the pipeline would see without hedging
+            "p99_improvement_seconds": holdout_p99 - hedged_p99
+            if holdout_p99 is not None and hedged_p99 is not None else None
+        }
+
+
+class Hedger:
+    def __init__(self,
+                 percentile: float = config['hedging']['percentile'],
+                 min_samples: int = config['hedging']['min_samples'],
+                 window: int = config['hedging']['window'],
+                 min_delay: float = config['hedging']['min_delay'],
+                 max_delay: float = config['hedging']['max_delay'],
+                 max_hedges_per_run: int = config['hedging']['max_hedges_per_run'],
+                 holdout_rate: float = config['hedging']['holdout_rate']):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.max_hedges_per_run = max_hedges_per_run
+        self.holdout_rate = holdout_rate
+        self._metrics: Dict[Tuple[str, str], HedgeMetrics] = {}
+
+    def metrics(self, stage: str, model: str) -> HedgeMetrics:
+        key = (stage, model)
+        if key not in self._metrics:
+            self._metrics[key] = HedgeMetrics(self.window)
+        return self._metrics[key]
+
+    def hedge_delay(self, stage: str, model: str) -> Optional[float]:
+        metrics = self.metrics(stage, model)
+        # Answers from a hedge cut the latency short, so the trigger comes from how long primaries take: holdout
+        # calls once there are enough, otherwise primary timings where a losing primary counts at its cancellation
+        # time, a lower bound that still ranks above the current delay
+        samples = metrics.holdout_samples if len(metrics.holdout_samples) >= max(1, self.min_samples) else \
+            [*metrics.primary_samples, *metrics.holdout_samples]
+        if len(samples) < max(1, self.min_samples):
+            return None
+        ordered = sorted(samples)
+        delay = ordered[min(len(ordered) - 1, int(self.percentile / 100 * len(ordered)))]
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    @contextmanager
+    def run_budget(self) -> Iterator[HedgeBudget]:
+        budget = HedgeBudget(self.max_hedges_per_run)
+        token = _run_budget.set(budget)
+        try:
+            yield budget
+        finally:
+            _run_budget.reset(token)
+
+    def _acquire(self, metrics: HedgeMetrics) -> bool:
+        budget = _run_budget.get()
+        if budget is None or budget.try_acquire():
+            return True
+        metrics.budget_denied += 1
+        return False
+
+    async def call(self,
+                   stage: str,
+                   model: str,
+                   primary: Callable[[], Awaitable[T]],
+                   backup: Optional[Callable[[], Awaitable[T]]] = None,
+                   tokens: int = 0,
+                   retry_on_failure: bool = True) -> T:
+        metrics = self.metrics(stage, model)
+        holdout = random.random() < self.holdout_rate
+        delay = None if holdout else self.hedge_delay(stage, model)
+        start = time.perf_counter()
+
+        primary_task = asyncio.ensure_future(primary())
+        tasks: List[asyncio.Future] = [primary_task]
+        pending = {primary_task}
+        error: Optional[BaseException] = None
+        try:
+            timeout = delay
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                timeout = None
+                for task in done:
+                    if task.cancelled():
+                        error = error or asyncio.CancelledError()
+                    elif task.exception() is not None:
+                        error = error or task.exception()
+                    else:
+                        seconds = time.perf_counter() - start
+                        # After a failover the primary's latency is unknown, so only the call is timed
+                        metrics.observe(seconds, holdout, None if error is not None else seconds)
+                        if task is not primary_task:
+                            metrics.backup_wins += 1
+                        return task.result()
+
+                # A slow primary is hedged once its latency passes the percentile; a failed one fails over, but
+                # re-sending the same request only helps when the error was transient and nothing retried it yet
+                failover = bool(done) and (backup is not None or (retry_on_failure and is_retryable(error)))
+                if len(tasks) == 1 and (failover or not done) and self._acquire(metrics):
+                    if done:
+                        metrics.failovers += 1
+                        logger.warning(f"{stage} call on {model} failed ({type(error).__name__}: {str(error)}); "
+                                       f"failing over")
+                    else:
+                        metrics.hedged += 1
+                        logger.info(f"{stage} call on {model} exceeded {delay:.2f}s; sending a hedged request")
+                    metrics.extra_requests += 1
+                    metrics.extra_estimated_tokens += tokens
+                    backup_task = asyncio.ensure_future((backup or primary)())
+                    tasks.append(backup_task)
+                    pending.add(backup_task)
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                task.add_done_callback(_consume_result)
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {f"{stage}/{model}": metrics.summary() for (stage, model), metrics in sorted(self._metrics.items())}
+
+    def to_prometheus(self) -> str:
+        counters = [
+            ("reviser_hedge_calls_total", "Calls made through the hedger.", "calls"),
+            ("reviser_hedge_hedged_total", "Duplicate requests sent for slow calls.", "hedged"),
+            ("reviser_hedge_failovers_total", "Backup requests sent after a failed call.", "failovers"),
+            ("reviser_hedge_backup_wins_total", "Calls answered by the backup request.", "backup_wins"),
+            ("reviser_hedge_budget_denied_total", "Hedges skipped because the run budget was spent.",
+             "budget_denied"),
+            ("reviser_hedge_extra_estimated_tokens_total", "Estimated prompt tokens sent in backup requests.",
+             "extra_estimated_tokens")
+        ]
+        items = sorted(self._metrics.items())
+        lines: List[str] = []
+        for name, description, attribute in counters:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} counter")
+            for (stage, model), metrics in items:
+                lines.append(f'{name}{{stage="{stage}",model="{model}"}} {getattr(metrics, attribute)}')
+        lines.append("# HELP reviser_hedge_p99_improvement_seconds Holdout p99 latency minus hedged p99 latency.")
+        lines.append("# TYPE reviser_hedge_p99_improvement_seconds gauge")
+        for (stage, model), metrics in items:
+            improvement = metrics.summary()["p99_improvement_seconds"]
+            if improvement is not None:
+                lines.append(f'reviser_hedge_p99_improvement_seconds{{stage="{stage}",model="{model}"}} {improvement}')
+        return "\n".join(lines) + "\n"
+
+
+def _consume_result(task: asyncio.Future):
+    # Losing requests are not awaited, so their failures are retrieved here to keep asyncio from logging them
+    if not task.cancelled():
+        task.exception()
+
+
+def build_hedger(settings: Optional[Dict[str, Any]] = None) -> Optional[Hedger]:
+    settings = config['hedging'] if settings is None else settings
+    if not settings.get('enabled'):
+        return None
+    return Hedger(
+        percentile=settings['percentile'],
+        min_samples=settings['min_samples'],
+        window=settings['window'],
+        min_delay=settings['min_delay'],
+        max_delay=settings['max_delay'],
+        max_hedges_per_run=settings['max_hedges_per_run'],
+        holdout_rate=settings['holdout_rate']
+    )
@@ -0,0 +1,128 @@
+import re
+from statistics import mean
+from typing import Dict, List, Optional
+
+from config import config
+from evaluator import AggregatedEvaluationResult, BaseEvaluator, EvaluationResult, aggregate_evaluations
+
+_WORD = re.compile(r"[A-Za-z0-9']+")
+_SENTENCE = re.compile(r'[^.!?\n]+[.!?]*')
+_VOWEL_GROUP = re.compile(r'[aeiouy]+')
+_STOPWORDS = frozenset("""
+a about above after again all also an and any are as at be because been before being below between both but by can
+could did do does doing down during each few for from further had has have having he her here hers him his how i if in
+into is it its itself just me more most my no nor not now of off on once only or other our out over own same she
+should so some such than that the their them then there these they this those through to too under until up very was
+we were what when where which while who whom why will with would you your
+""".split())
+
+
+def words(text: str) -> List[str]:
+    return _WORD.findall(text)
+
+
+def sentences(text: str) -> List[str]:
+    return [sentence for sentence in (s.strip() for s in _SENTENCE.findall(text)) if words(sentence)]
+
+
+def count_syllables(word: str) -> int:
+    word = word.lower()
+    syllables = len(_VOWEL_GROUP.findall(word))
+    if word.endswith('e') and syllables > 1 and not word.endswith(('le', 'ee')):
+        syllables -= 1
+    return max(1, syllables)
+
+
+def flesch_reading_ease(text: str) -> float:
+    text_words = words(text)
+    if not text_words:
+        return 0.0
+    sentence_count = max(1, len(sentences(text)))
+    syllables = sum(count_syllables(word) for word in text_words)
+    return 206.835 - 1.015 * (len(text_words) / sentence_count) - 84.6 * (syllables / len(text_words))
+
+
+def content_words(text: str) -> set:
+    return {word.lower() for word in words(text) if len(word) > 3 and word.lower() not in _STOPWORDS}
+
+
+def keyword_recall(source: str, output: str) -> Optional[float]:
+    expected = content_words(source)
+    if not expected:
+        return None
+    return len(expected & content_words(output)) / len(expected)
+
+
+class HeuristicEvaluator(BaseEvaluator):
+    def __init__(self,
+                 evaluation_aspects: List[str] = config['evaluation']['aspects'],
+                 min_score: int = config['evaluation']['score_range']['min'],
+                 max_score: int = config['evaluation']['score_range']['max']):
+        self.evaluation_aspects = evaluation_aspects
+        self.min_score = min_score
+        self.max_score = max_score
+
+    async def evaluate(self,
+                       system_prompt: str,
+                       user_input: str,
+                       current_output: str,
+                       previous_output: Optional[str] = None) -> AggregatedEvaluationResult:
+        scorers = {
+            "relevance": lambda: self._coverage("user input", user_input, current_output),
+            "accuracy": lambda: self._coverage("system prompt", system_prompt, current_output),
+            "coherence": lambda: self._coherence(current_output),
+            "simplicity": lambda: self._simplicity(current_output, previous_output)
+        }
+        scored = {aspect: scorers[aspect]() for aspect in self.evaluation_aspects if aspect in scorers}
+        fallback = round(mean(result.score for result in scored.values())) if scored else self.min_score
+
+        results = [
+            scored.get(aspect) or EvaluationResult(
+                score=fallback, reasoning=f"No heuristic is available for {aspect}; using the mean of the other aspects."
+            )
+            for aspect in self.evaluation_aspects
+        ]
+        return aggregate_evaluations(self.evaluation_aspects, results)
+
+    def _result(self, score: float, reasoning: str) -> EvaluationResult:
+        return EvaluationResult(score=round(min(self.max_score, max(self.min_score, score))), reasoning=reasoning)
+
+    def _coverage(self, source_name: str, source: str, output: str) -> EvaluationResult:
+        if not words(output):
+            return self._result(self.min_score, "The output is empty.")
+        recall = keyword_recall(source, output)
+        if recall is None:
+            return self._result(70, f"The {source_name} has no key terms to check the output against.")
+        return self._result(40 + 60 * recall,
+                            f"The output mentions {recall:.0%} of the key terms from the {source_name}.")
+
+    def _coherence(self, output: str) -> EvaluationResult:
+        output_sentences = sentences(output)
+        if not output_sentences:
+            return self._result(self.min_score, "The output is empty.")
+        average_length = mean(len(words(sentence)) for sentence in output_sentences)
+        paragraphs = len([paragraph for paragraph in re.split(r'\n\s*\n', output) if paragraph.strip()])
+
+        score = 95.0
+        notes = [f"average sentence length is {average_length:.1f} words"]
+        if average_length > 25:
+            score -= min(40.0, (average_length - 25) * 2)
+            notes.append("long sentences make it harder to follow")
+        elif average_length < 6:
+            score -= min(30.0, (6 - average_length) * 6)
+            notes.append("very short fragments break up the flow")
+        if len(output_sentences) > 8 and paragraphs == 1:
+            score -= 10
+            notes.append("it is a single block of text with no paragraph structure")
+        return self._result(score, "Heuristic coherence check: " + "; ".join(notes) + ".")
+
+    def _simplicity(self, output: str, previous_output: Optional[str]) -> EvaluationResult:
+        reading_ease = flesch_reading_ease(output)
+        score = 40 + 0.6 * max(0.0, min(100.0, reading_ease))
+        notes = [f"Flesch reading ease is {reading_ease:.0f}"]
+        if previous_output:
+            growth = (len(words(output)) - len(words(previous_output))) / max(1, len(words(previous_output)))
+            if growth > 0.2:
+                score -= min(25.0, (growth - 0.2) * 50)
+                notes.append(f"the output grew by {growth:.0%} compared to the previous output")
+        return self._result(score, "Heuristic simplicity check: " + "; ".join(notes) + ".")
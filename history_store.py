@@ -0,0 +1,197 @@
+import sys
+from difflib import SequenceMatcher
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from pydantic_core import core_schema
+
+from config import config
+
+# A delta is a flat tuple: a positive int copies that many lines of the previous version, a negative int skips
+# lines of the previous version and a string is an inserted line
+Delta = Tuple[Union[int, str], ...]
+
+
+# Interned strings are never freed on CPython 3.12+, so only short values that repeat across runs (keys, aspect names,
+# sources, stop reasons) are interned; large bodies stay per-run and revised outputs are shared with the history
+INTERN_MAX_LENGTH = 64
+
+
+def intern_value(value: Any) -> Any:
+    if type(value) is str:
+        return sys.intern(value) if len(value) <= INTERN_MAX_LENGTH else value
+    if isinstance(value, dict):
+        return {intern_value(key): intern_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [intern_value(item) for item in value]
+    return value
+
+
+def diff_lines(before: List[str], after: List[str]) -> Delta:
+    delta: List[Union[int, str]] = []
+    matcher = SequenceMatcher(None, before, after, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            delta.append(i2 - i1)
+            continue
+        if i2 > i1:
+            delta.append(i1 - i2)
+        delta.extend(after[j1:j2])
+    return tuple(delta)
+
+
+def apply_delta(before: List[str], delta: Delta) -> List[str]:
+    lines: List[str] = []
+    cursor = 0
+    for item in delta:
+        if type(item) is str:
+            lines.append(item)
+        elif item > 0:
+            lines.extend(before[cursor:cursor + item])
+            cursor += item
+        else:
+            cursor -= item
+    return lines
+
+
+def _pydantic_schema(cls: Any) -> core_schema.CoreSchema:
+    return core_schema.no_info_plain_validator_function(
+        cls.validate,
+        serialization=core_schema.plain_serializer_function_ser_schema(list)
+    )
+
+
+class RevisionHistory(Sequence[str]):
+    def __init__(self,
+                 texts: Iterable[str] = (),
+                 checkpoint_every: int = config['history']['checkpoint_every']):
+        self.checkpoint_every = max(1, checkpoint_every)
+        # Every checkpoint_every-th version is kept whole and the ones between as line deltas from their
+        # predecessor; nothing else is cached, so a finished run only holds the checkpoints and deltas
+        self._checkpoints: List[str] = []
+        self._deltas: List[Optional[Delta]] = []
+        for text in texts:
+            self.append(text)
+
+    def append(self, text: str):
+        if len(self._deltas) % self.checkpoint_every == 0:
+            self._checkpoints.append(text)
+            self._deltas.append(None)
+        else:
+            self._deltas.append(diff_lines(self._lines(len(self._deltas) - 1), text.splitlines(keepends=True)))
+
+    def _lines(self, index: int) -> List[str]:
+        checkpoint = index // self.checkpoint_every
+        lines = self._checkpoints[checkpoint].splitlines(keepends=True)
+        for position in range(checkpoint * self.checkpoint_every + 1, index + 1):
+            lines = apply_delta(lines, self._deltas[position])
+        return lines
+
+    def __len__(self) -> int:
+        return len(self._deltas)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("revision history index out of range")
+        if self._deltas[index] is None:
+            return self._checkpoints[index // self.checkpoint_every]
+        return "".join(self._lines(index))
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (RevisionHistory, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"RevisionHistory({list(self)!r})"
+
+    @classmethod
+    def validate(cls, value: Any) -> "RevisionHistory":
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, (list, tuple)) and all(isinstance(text, str) for text in value):
+            return cls(value)
+        raise ValueError("revision history must be a list of strings")
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source: Any, handler: Any) -> core_schema.CoreSchema:
+        return _pydantic_schema(cls)
+
+
+class _OutputRef:
+    __slots__ = ('index', 'shared')
+
+    def __init__(self, index: int, shared: bool):
+        self.index = index
+        self.shared = shared
+
+
+class HistoryLog(Sequence[Dict[str, Any]]):
+    def __init__(self,
+                 entries: Iterable[Dict[str, Any]] = (),
+                 outputs: Optional[RevisionHistory] = None,
+                 checkpoint_every: int = config['history']['checkpoint_every']):
+        # Entry i usually revised its way to outputs[i + 1], which is then referenced instead of stored again
+        self.outputs = outputs
+        self._own_outputs = RevisionHistory(checkpoint_every=checkpoint_every)
+        self._entries: List[Dict[str, Any]] = []
+        for entry in entries:
+            self.append(entry)
+
+    def append(self, entry: Dict[str, Any]):
+        compact = {}
+        for key, value in entry.items():
+            if key == 'revised_output' and isinstance(value, str):
+                # Key order is kept so materialized entries serialize exactly like the originals
+                compact[key] = self._store_output(value)
+            else:
+                compact[key] = intern_value(value)
+        self._entries.append(compact)
+
+    def _store_output(self, text: str) -> _OutputRef:
+        index = len(self._entries) + 1
+        if self.outputs is not None and index < len(self.outputs) and self.outputs[index] == text:
+            return _OutputRef(index, shared=True)
+        self._own_outputs.append(text)
+        return _OutputRef(len(self._own_outputs) - 1, shared=False)
+
+    def sharing(self, outputs: RevisionHistory) -> "HistoryLog":
+        if self.outputs is outputs:
+            return self
+        return HistoryLog(self, outputs, self._own_outputs.checkpoint_every)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return {key: self._materialize(value) for key, value in self._entries[index].items()}
+
+    def _materialize(self, value: Any) -> Any:
+        if not isinstance(value, _OutputRef):
+            return value
+        return self.outputs[value.index] if value.shared else self._own_outputs[value.index]
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (HistoryLog, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"HistoryLog({list(self)!r})"
+
+    @classmethod
+    def validate(cls, value: Any) -> "HistoryLog":
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, (list, tuple)) and all(isinstance(entry, dict) for entry in value):
+            return cls(value)
+        raise ValueError("history log must be a list of dicts")
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source: Any, handler: Any) -> core_schema.CoreSchema:
+        return _pydantic_schema(cls)
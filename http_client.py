@@ -0,0 +1,56 @@
+import logging
+from typing import Optional
+
+import aiohttp
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPClientPool:
+    def __init__(self,
+                 limit: int = config['http']['limit'],
+                 limit_per_host: int = config['http']['limit_per_host'],
+                 keepalive_timeout: float = config['http']['keepalive_timeout'],
+                 ttl_dns_cache: int = config['http']['ttl_dns_cache'],
+                 timeout: float = config['http']['timeout']):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        # No await between the check and the assignment, so concurrent callers share one session
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                use_dns_cache=True,
+                ttl_dns_cache=self.ttl_dns_cache
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            logger.debug(f"Opened HTTP connection pool (limit={self.limit}, limit_per_host={self.limit_per_host})")
+        return self._session
+
+    @property
+    def closed(self) -> bool:
+        return self._session is None or self._session.closed
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.debug("Closed HTTP connection pool")
+        self._session = None
+
+    async def __aenter__(self) -> "HTTPClientPool":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
@@ -0,0 +1,248 @@
+import json
+import logging
+import time
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from budget import record_usage
+from config import config
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+logger = logging.getLogger(__name__)
+
+
+class StageMetrics:
+    def __init__(self, max_samples: int):
+        self.samples: Deque[float] = deque(maxlen=max_samples)
+        self.count = 0
+        self.total_seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.errors = 0
+        self.parse_failures = 0
+
+    def observe(self, span: "Span"):
+        self.samples.append(span.seconds)
+        self.count += 1
+        self.total_seconds += span.seconds
+        self.prompt_tokens += span.prompt_tokens
+        self.completion_tokens += span.completion_tokens
+        self.cached_prompt_tokens += span.cached_prompt_tokens
+        self.retries += span.retries
+        self.cache_hits += int(span.cache_hit)
+        self.errors += int(span.error)
+        self.parse_failures += span.parse_failures
+
+    @property
+    def uncached_prompt_tokens(self) -> int:
+        return self.prompt_tokens - self.cached_prompt_tokens
+
+    def quantile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> Dict[str, Any]:
+        quantiles = {f"p{int(q * 100)}": self.quantile(q) for q in QUANTILES}
+        return {
+            "count": self.count,
+            "mean_seconds": self.total_seconds / self.count if self.count else 0.0,
+            **quantiles,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "uncached_prompt_tokens": self.uncached_prompt_tokens,
+            "retries": self.retries,
+            "cache_hits": self.cache_hits,
+            "errors": self.errors,
+            "parse_failures": self.parse_failures
+        }
+
+
+class Span:
+    def __init__(self, instrumentation: "Instrumentation", stage: str, model: str):
+        self.instrumentation = instrumentation
+        self.stage = stage
+        self.model = model
+        self.seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.retries = 0
+        self.cache_hit = False
+        self.error = False
+        self.parse_failures = 0
+        self._start = 0.0
+
+    def add_usage(self, prompt_tokens: int = 0, completion_tokens: int = 0, cached_prompt_tokens: int = 0):
+        self.prompt_tokens += prompt_tokens or 0
+        self.completion_tokens += completion_tokens or 0
+        self.cached_prompt_tokens += cached_prompt_tokens or 0
+
+    @property
+    def uncached_prompt_tokens(self) -> int:
+        return self.prompt_tokens - self.cached_prompt_tokens
+
+    def __enter__(self) -> "Span":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.seconds = time.perf_counter() - self._start
+        self.error = exc_type is not None
+        record_usage(self.model, self.prompt_tokens, self.completion_tokens)
+        if self.prompt_tokens:
+            logger.debug(f"{self.stage} call on {self.model}: {self.prompt_tokens} prompt tokens "
+                         f"({self.cached_prompt_tokens} cached, {self.uncached_prompt_tokens} uncached)")
+        self.instrumentation.observe(self)
+        return False
+
+
+class NoOpSpan(Span):
+    def __init__(self, model: str = ""):
+        super().__init__(None, "", model)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # Run budgets still need token counts when stage metrics are switched off
+        record_usage(self.model, self.prompt_tokens, self.completion_tokens)
+        return False
+
+
+class Instrumentation:
+    def __init__(self,
+                 enabled: bool = config['instrumentation']['enabled'],
+                 max_samples: int = config['instrumentation']['max_samples']):
+        self.enabled = enabled
+        self.max_samples = max_samples
+        self._metrics: Dict[Tuple[str, str], StageMetrics] = {}
+        self._lock = threading.Lock()
+
+    def span(self, stage: str, model: str = "") -> Span:
+        if not self.enabled:
+            return NoOpSpan(model)
+        return Span(self, stage, model)
+
+    def observe(self, span: Span):
+        with self._lock:
+            key = (span.stage, span.model)
+            if key not in self._metrics:
+                self._metrics[key] = StageMetrics(self.max_samples)
+            self._metrics[key].observe(span)
+
+    def reset(self):
+        with self._lock:
+            self._metrics = {}
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        with self._lock:
+            items = list(self._metrics.items())
+        summary: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (stage, model), metrics in sorted(items):
+            summary.setdefault(stage, {})[model or "default"] = metrics.summary()
+        return summary
+
+    def to_json(self) -> str:
+        return json.dumps(self.summary(), indent=2)
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            items = sorted(self._metrics.items())
+
+        lines: List[str] = [
+            "# HELP reviser_stage_latency_seconds Wall time of pipeline stages.",
+            "# TYPE reviser_stage_latency_seconds summary"
+        ]
+        for (stage, model), metrics in items:
+            labels = f'stage="{_escape(stage)}",model="{_escape(model)}"'
+            for q in QUANTILES:
+                lines.append(f'reviser_stage_latency_seconds{{{labels},quantile="{q}"}} {metrics.quantile(q)}')
+            lines.append(f"reviser_stage_latency_seconds_sum{{{labels}}} {metrics.total_seconds}")
+            lines.append(f"reviser_stage_latency_seconds_count{{{labels}}} {metrics.count}")
+
+        counters = [
+            ("reviser_stage_prompt_tokens_total", "Prompt tokens sent per stage.", "prompt_tokens"),
+            ("reviser_stage_cached_prompt_tokens_total", "Prompt tokens served from provider caches.",
+             "cached_prompt_tokens"),
+            ("reviser_stage_uncached_prompt_tokens_total", "Prompt tokens billed at the full input rate.",
+             "uncached_prompt_tokens"),
+            ("reviser_stage_completion_tokens_total", "Completion tokens received per stage.", "completion_tokens"),
+            ("reviser_stage_retries_total", "Retried calls per stage.", "retries"),
+            ("reviser_stage_cache_hits_total", "Local cache hits per stage.", "cache_hits"),
+            ("reviser_stage_errors_total", "Failed calls per stage.", "errors"),
+            ("reviser_stage_parse_failures_total", "Responses that could not be parsed.", "parse_failures")
+        ]
+        for name, description, attribute in counters:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} counter")
+            for (stage, model), metrics in items:
+                labels = f'stage="{_escape(stage)}",model="{_escape(model)}"'
+                lines.append(f"{name}{{{labels}}} {getattr(metrics, attribute)}")
+        return "\n".join(lines) + "\n"
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    def __init__(self, span: Span):
+        self.span = span
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any):
+        usage = _usage_from_generations(response) or _usage_from_llm_output(response.llm_output or {})
+        if usage:
+            self.span.add_usage(*usage)
+
+
+def _usage_from_generations(response: LLMResult) -> Optional[Tuple[int, int, int]]:
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, 'message', None)
+            usage_metadata = getattr(message, 'usage_metadata', None)
+            if usage_metadata:
+                details = usage_metadata.get('input_token_details')
+                if details is not None:
+                    return (usage_metadata.get('input_tokens', 0),
+                            usage_metadata.get('output_tokens', 0),
+                            details.get('cache_read') or 0)
+                usage = _raw_usage(getattr(message, 'response_metadata', {}) or {}) or \
+                    _raw_usage(response.llm_output or {})
+                return (usage_metadata.get('input_tokens', 0) + _anthropic_cache_tokens(usage),
+                        usage_metadata.get('output_tokens', 0),
+                        _cached_tokens(usage))
+    return None
+
+
+def _usage_from_llm_output(llm_output: Dict[str, Any]) -> Optional[Tuple[int, int, int]]:
+    usage = _raw_usage(llm_output)
+    if not usage:
+        return None
+    return (usage.get('prompt_tokens', usage.get('input_tokens', 0)) + _anthropic_cache_tokens(usage),
+            usage.get('completion_tokens', usage.get('output_tokens', 0)),
+            _cached_tokens(usage))
+
+
+def _raw_usage(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    return metadata.get('token_usage') or metadata.get('usage') or {}
+
+
+def _anthropic_cache_tokens(usage: Dict[str, Any]) -> int:
+    # Anthropic's input_tokens only counts the uncached part of the prompt
+    return (usage.get('cache_read_input_tokens') or 0) + (usage.get('cache_creation_input_tokens') or 0)
+
+
+def _cached_tokens(usage: Dict[str, Any]) -> int:
+    details = usage.get('prompt_tokens_details') or {}
+    return (details.get('cached_tokens') or 0) + (usage.get('cache_read_input_tokens') or 0)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+instrumentation = Instrumentation()
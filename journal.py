@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class RevisionJournal:
+    def __init__(self,
+                 directory: str = config['journal']['directory'],
+                 fsync: bool = config['journal']['fsync']):
+        self.directory = directory
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, run_id: str, suffix: str) -> str:
+        safe_run_id = re.sub(r'[^A-Za-z0-9._-]', '_', run_id)
+        return os.path.join(self.directory, f"{safe_run_id}{suffix}")
+
+    def _append(self, run_id: str, record: Dict[str, Any]):
+        with open(self._path(run_id, '.jsonl'), 'a') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def start(self, run_id: str, revision_input: Dict[str, Any]):
+        # Starting a run again discards its previous journal; use load() to continue one instead
+        if os.path.exists(self._path(run_id, '.result.json')):
+            os.remove(self._path(run_id, '.result.json'))
+        with open(self._path(run_id, '.jsonl'), 'w') as f:
+            f.write(json.dumps({"type": "start", "input": revision_input}) + '\n')
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def record_iteration(self, run_id: str, iteration: int, iteration_result: Dict[str, Any]):
+        self._append(run_id, {"type": "iteration", "iteration": iteration, "result": iteration_result})
+
+    def finish(self, run_id: str, revision_result: Dict[str, Any]):
+        path = self._path(run_id, '.result.json')
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(revision_result, f)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    def is_finished(self, run_id: str) -> bool:
+        return os.path.exists(self._path(run_id, '.result.json'))
+
+    def load_result(self, run_id: str) -> Optional[Dict[str, Any]]:
+        if not self.is_finished(run_id):
+            return None
+        with open(self._path(run_id, '.result.json'), 'r') as f:
+            return json.load(f)
+
+    def load(self, run_id: str) -> Optional[Dict[str, Any]]:
+        path = self._path(run_id, '.jsonl')
+        if not os.path.exists(path):
+            return None
+
+        revision_input = None
+        iterations: List[Dict[str, Any]] = []
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave a partially written last line; everything before it is intact
+                    logger.warning(f"Ignoring truncated journal record for run {run_id}")
+                    break
+                if record['type'] == 'start':
+                    revision_input = record['input']
+                elif record['type'] == 'iteration' and record['iteration'] == len(iterations) + 1:
+                    iterations.append(record['result'])
+
+        return {"input": revision_input, "iterations": iterations}
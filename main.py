@@ -1,13 +1,21 @@
+import argparse
 import asyncio
+import json
 import logging
-from langchain_anthropic import ChatAnthropic
-from langchain_openai import ChatOpenAI
+import os
+from typing import Iterator, Optional
+from cache import ResultCache
+from concurrency import ProviderLimiter
+from hedging import AlternateModel, build_hedger
+from journal import RevisionJournal
+from providers import create_llm
+from rate_limiter import RateLimiter
 from config import config
-from evaluator import OpenAIEvaluator, MultiEvaluator
+from instrumentation import instrumentation
+from evaluator import OpenAIEvaluator, MultiEvaluator, BatchedAspectEvaluator, CascadeEvaluator
 from reviser import Reviser, RevisionInput
-from task_writer_test_input import TASK_WRITER_SYSTEM_PROMPT, TASK_WRITER_INITIAL_INPUT, TASK_WRITER_INITIAL_OUTPUT
 from tracing import tracer
-from output_handler import write_output_files, write_structured_output
+from output_handler import FileOutputSink
 
 logging.basicConfig(level=config['logging']['level'], format=config['logging']['format'])
 logger = logging.getLogger(__name__)
@@ -15,46 +23,244 @@ logger = logging.getLogger(__name__)
 
 def get_llm(config: dict, model_type: str):
     model_config = config['llm'][model_type]
-    provider = model_config['provider']
+    return create_llm(model_config['provider'], model_config['name'], config)
 
-    if provider == 'openai':
-        return ChatOpenAI(model=model_config['name'], api_key=config['env']['OPENAI_API_KEY'])
-    elif provider == 'anthropic':
-        return ChatAnthropic(model=model_config['name'], api_key=config['env']['ANTHROPIC_API_KEY'])
-    else:
-        raise ValueError(f"Unsupported model provider: {provider}")
 
+def get_alternate(config: dict, model_type: str):
+    if not config['hedging']['enabled']:
+        return None
+    model_config = (config['hedging'].get('alternates') or {}).get(model_type)
+    if not model_config:
+        return None
+    return AlternateModel(create_llm(model_config['provider'], model_config['name'], config),
+                          model_config['provider'])
+
+
+def build_cache(config: dict):
+    if not config['cache']['enabled']:
+        return None
+    return ResultCache()
+
+
+def build_journal(config: dict):
+    if not config['journal']['enabled']:
+        return None
+    return RevisionJournal()
 
-@tracer(run_type="chain", name="Main Revision Pipeline")
-async def main():
-    agent_llm = get_llm(config, 'agent_model')
-    reviser_llm = get_llm(config, 'reviser_model')
 
-    evaluators = [
+def build_evaluators(config: dict, cache=None):
+    return [
         OpenAIEvaluator(
             api_key=config['env']['OPENAI_API_KEY'],
             model=config['llm']['evaluator_model']['name'],
-            evaluation_aspect=aspect
+            evaluation_aspect=aspect,
+            cache=cache
         )
         for aspect in config['evaluation']['aspects']
     ]
-    multi_evaluator = MultiEvaluator(evaluators)
-    reviser = Reviser(agent_llm, reviser_llm, multi_evaluator)
 
-    revision_input = RevisionInput(
-        system_prompt=TASK_WRITER_SYSTEM_PROMPT,
-        user_input=TASK_WRITER_INITIAL_INPUT,
-        initial_output=TASK_WRITER_INITIAL_OUTPUT
-    )
 
-    result = await reviser.revise(revision_input)
+def build_screen_evaluator(config: dict, cache=None, limiter=None, rate_limiter=None, hedger=None):
+    cascade = config['evaluation']['cascade']
+    if cascade['screen'] == 'heuristic':
+        from heuristics import HeuristicEvaluator
+        return HeuristicEvaluator(config['evaluation']['aspects'])
+    if cascade['screen'] == 'model':
+        return BatchedAspectEvaluator(
+            api_key=config['env']['OPENAI_API_KEY'],
+            model=cascade['screen_model'],
+            evaluation_aspects=config['evaluation']['aspects'],
+            cache=cache,
+            limiter=limiter,
+            rate_limiter=rate_limiter,
+            hedger=hedger
+        )
+    raise ValueError(f"Unsupported screening evaluator: {cascade['screen']}")
+
+
+def build_evaluator(config: dict, cache=None, limiter=None, rate_limiter=None, mode: Optional[str] = None,
+                    hedger=None):
+    mode = mode or config['evaluation']['mode']
+    if mode == 'cascade':
+        return CascadeEvaluator(
+            build_screen_evaluator(config, cache, limiter, rate_limiter, hedger),
+            build_evaluator(config, cache, limiter, rate_limiter, mode=config['evaluation']['cascade']['full_mode'],
+                            hedger=hedger)
+        )
+    if mode == 'batched':
+        return BatchedAspectEvaluator(
+            api_key=config['env']['OPENAI_API_KEY'],
+            model=config['llm']['evaluator_model']['name'],
+            evaluation_aspects=config['evaluation']['aspects'],
+            cache=cache,
+            limiter=limiter,
+            rate_limiter=rate_limiter,
+            hedger=hedger
+        )
+    return MultiEvaluator(build_evaluators(config, cache), limiter=limiter, rate_limiter=rate_limiter, hedger=hedger)
+
+
+def build_reviser(config: dict, evaluator, limiter, rate_limiter, cache=None, hedger=None) -> Reviser:
+    return Reviser(get_llm(config, 'agent_model'), get_llm(config, 'reviser_model'), evaluator, limiter=limiter,
+                   cache=cache, rate_limiter=rate_limiter, journal=build_journal(config), hedger=hedger,
+                   alternate_agent=get_alternate(config, 'agent_model'),
+                   alternate_reviser=get_alternate(config, 'reviser_model'))
+
+
+def log_evaluator_stats(evaluator):
+    if isinstance(evaluator, CascadeEvaluator):
+        logger.info(f"Evaluator cascade stats: {evaluator.get_stats()}")
+
+
+def log_hedger_stats(hedger):
+    if hedger:
+        logger.info(f"Hedging stats: {hedger.get_stats()}")
+
+
+def export_metrics(config: dict):
+    if not instrumentation.enabled or not config['instrumentation']['export_dir']:
+        return
+    export_dir = config['instrumentation']['export_dir']
+    os.makedirs(export_dir, exist_ok=True)
+    with open(os.path.join(export_dir, 'metrics.json'), 'w') as f:
+        f.write(instrumentation.to_json())
+    with open(os.path.join(export_dir, 'metrics.prom'), 'w') as f:
+        f.write(instrumentation.to_prometheus())
+    logger.info(f"Stage metrics written to {export_dir}")
+
+
+def read_jobs(jobs_file: str) -> Iterator[RevisionInput]:
+    with open(jobs_file, 'r') as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            job = json.loads(line)
+            job.setdefault('job_id', str(line_number))
+            yield RevisionInput(**job)
+
+
+@tracer(run_type="chain", name="Batch Revision Pipeline")
+async def run_batch(jobs_file: str, results_file: str, max_concurrency: int, write_outputs: bool = False):
+    limiter = ProviderLimiter()
+    rate_limiter = RateLimiter()
+    cache = build_cache(config)
+    hedger = build_hedger()
+
+    async with build_evaluator(config, cache, limiter, rate_limiter, hedger=hedger) as multi_evaluator:
+        reviser = build_reviser(config, multi_evaluator, limiter, rate_limiter, cache, hedger)
+        completed = failed = 0
+        sink_factory = None
+        if write_outputs:
+            def sink_factory(revision_input: RevisionInput) -> FileOutputSink:
+                return FileOutputSink(os.path.join(config['output']['directory'], revision_input.job_id or 'unnamed'),
+                                      debug=config.get('DEBUG', False))
+
+        with open(results_file, 'w') as f:
+            async for result in reviser.revise_many(read_jobs(jobs_file), max_concurrency=max_concurrency,
+                                                    sink_factory=sink_factory):
+                f.write(result.model_dump_json() + '\n')
+                f.flush()
+                if result.error:
+                    failed += 1
+                else:
+                    completed += 1
+                logger.info(f"Job {result.job_id} finished ({completed} completed, {failed} failed)")
+        log_evaluator_stats(multi_evaluator)
+        log_hedger_stats(hedger)
+
+    logger.info(f"Batch finished: {completed} completed, {failed} failed. Results written to {results_file}")
+    if cache:
+        logger.info(f"Cache stats: {cache.get_stats()}")
+        cache.close()
+    export_metrics(config)
+
+
+async def serve(host: str, port: int, workers: int):
+    from aiohttp import web
+    from service import RevisionService, create_app
+
+    limiter = ProviderLimiter()
+    rate_limiter = RateLimiter()
+    cache = build_cache(config)
+    hedger = build_hedger()
+
+    async with build_evaluator(config, cache, limiter, rate_limiter, hedger=hedger) as multi_evaluator:
+        reviser = build_reviser(config, multi_evaluator, limiter, rate_limiter, cache, hedger)
+        runner = web.AppRunner(create_app(RevisionService(reviser, workers=workers)))
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"Revision service listening on http://{host}:{port}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+            log_evaluator_stats(multi_evaluator)
+            log_hedger_stats(hedger)
+            if cache:
+                cache.close()
+            export_metrics(config)
+
+
+@tracer(run_type="chain", name="Main Revision Pipeline")
+async def main(run_id: Optional[str] = None, resume: bool = False):
+    limiter = ProviderLimiter()
+    rate_limiter = RateLimiter()
+    cache = build_cache(config)
+    hedger = build_hedger()
+
+    async with build_evaluator(config, cache, limiter, rate_limiter, hedger=hedger) as multi_evaluator:
+        reviser = build_reviser(config, multi_evaluator, limiter, rate_limiter, cache, hedger)
+
+        output_sink = FileOutputSink(debug=config.get('DEBUG', False))
+        if resume:
+            result = await reviser.resume(run_id, output_sink=output_sink)
+        else:
+            from task_writer_test_input import (TASK_WRITER_SYSTEM_PROMPT, TASK_WRITER_INITIAL_INPUT,
+                                                TASK_WRITER_INITIAL_OUTPUT)
+
+            revision_input = RevisionInput(
+                system_prompt=TASK_WRITER_SYSTEM_PROMPT,
+                user_input=TASK_WRITER_INITIAL_INPUT,
+                initial_output=TASK_WRITER_INITIAL_OUTPUT
+            )
+
+            result = await reviser.revise(revision_input, run_id=run_id, output_sink=output_sink)
+        log_evaluator_stats(multi_evaluator)
+        log_hedger_stats(hedger)
 
     logger.info("Final Revised Output:")
     logger.info(result.final_output)
 
-    write_output_files(result.final_output, result.history_log, debug=config.get('DEBUG', False))
-    write_structured_output(result.history_log)
+    if cache:
+        logger.info(f"Cache stats: {cache.get_stats()}")
+        cache.close()
+
+    export_metrics(config)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Revise AI-generated content with reflective feedback.")
+    parser.add_argument("--jobs", help="JSONL file of revision inputs to process as a batch")
+    parser.add_argument("--results", default="results.jsonl", help="JSONL file to stream batch results to")
+    parser.add_argument("--concurrency", type=int, default=config['batch']['max_concurrency'],
+                        help="Maximum number of revisions running at once")
+    parser.add_argument("--write-outputs", action="store_true",
+                        help="Stream per-job output files to output/<job_id>/ while the batch runs")
+    parser.add_argument("--serve", action="store_true", help="Run the resident HTTP revision service")
+    parser.add_argument("--host", default=config['service']['host'])
+    parser.add_argument("--port", type=int, default=config['service']['port'])
+    parser.add_argument("--workers", type=int, default=config['service']['workers'],
+                        help="Number of revisions the service runs at once")
+    parser.add_argument("--run-id", help="Journal the single revision run under this id")
+    parser.add_argument("--resume", metavar="RUN_ID", help="Continue a journaled run from its last completed iteration")
+    args = parser.parse_args()
+
+    if args.serve:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    elif args.jobs:
+        asyncio.run(run_batch(args.jobs, args.results, args.concurrency, args.write_outputs))
+    elif args.resume:
+        asyncio.run(main(run_id=args.resume, resume=True))
+    else:
+        asyncio.run(main(run_id=args.run_id))
@@ -1,5 +1,64 @@
+import json
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, TextIO
+
+from config import config
+
+
+def render_revision_history_entry(entry: Dict[str, Any]) -> str:
+    parts = [
+        f"{'='*50}\n",
+        f"ITERATION {entry.get('iteration', 'N/A')}\n",
+        f"{'='*50}\n\n"
+    ]
+
+    if 'evaluation' in entry and entry['evaluation']:
+        parts.append("EVALUATION:\n")
+        parts.append(f"Overall Score: {entry['evaluation'].get('overall_score', 'N/A')}\n")
+        parts.append(f"Aspect Scores: {entry['evaluation'].get('aspect_scores', 'N/A')}\n")
+        parts.append(f"Reasoning:\n{entry['evaluation'].get('combined_reasoning', 'N/A')}\n\n")
+    else:
+        parts.append("EVALUATION: Not available\n\n")
+
+    parts.append(f"FEEDBACK:\n{entry.get('feedback', 'N/A')}\n\n")
+
+    parts.append("SUGGESTIONS:\n")
+    for suggestion in entry.get('suggestions', []):
+        parts.append(f"- {suggestion}\n")
+    parts.append("\n")
+
+    parts.append(f"REVISED OUTPUT:\n{entry.get('revised_output', 'N/A')}\n\n")
+
+    parts.append(f"{'='*50}\n\n")
+    return "".join(parts)
+
+
+STRUCTURED_OUTPUT_HEADER = "# Revision Process Output\n\n## Revision History\n\n"
+STRUCTURED_OUTPUT_SEPARATOR = "---\n\n"
+
+
+def render_structured_entry(entry: Dict[str, Any]) -> str:
+    parts = [f"### Iteration {entry.get('iteration', 'N/A')}\n\n"]
+
+    if 'evaluation' in entry and entry['evaluation']:
+        parts.append("#### Evaluation\n\n")
+        parts.append(f"- Overall Score: {entry['evaluation'].get('overall_score', 'N/A')}\n")
+        parts.append("- Aspect Scores:\n")
+        for aspect, score in entry['evaluation'].get('aspect_scores', {}).items():
+            parts.append(f"  - {aspect}: {score}\n")
+        parts.append("\n")
+
+        parts.append("#### Reasoning\n\n")
+        parts.append(f"{entry['evaluation'].get('combined_reasoning', 'N/A')}\n\n")
+
+    parts.append("#### Suggestions\n\n")
+    for suggestion in entry.get('suggestions', []):
+        parts.append(f"- {suggestion}\n")
+    parts.append("\n")
+
+    parts.append("#### Revised Output\n\n")
+    parts.append(f"```\n{entry.get('revised_output', 'N/A')}\n```\n\n")
+    return "".join(parts)
 
 
 def write_output_files(final_output: str,
@@ -16,28 +75,7 @@ def write_output_files(final_output: str,
 
     with open(os.path.join(output_dir, 'revision_history.txt'), 'w') as f:
         for entry in history_log:
-            f.write(f"{'='*50}\n")
-            f.write(f"ITERATION {entry.get('iteration', 'N/A')}\n")
-            f.write(f"{'='*50}\n\n")
-
-            if 'evaluation' in entry and entry['evaluation']:
-                f.write("EVALUATION:\n")
-                f.write(f"Overall Score: {entry['evaluation'].get('overall_score', 'N/A')}\n")
-                f.write(f"Aspect Scores: {entry['evaluation'].get('aspect_scores', 'N/A')}\n")
-                f.write(f"Reasoning:\n{entry['evaluation'].get('combined_reasoning', 'N/A')}\n\n")
-            else:
-                f.write("EVALUATION: Not available\n\n")
-
-            f.write(f"FEEDBACK:\n{entry.get('feedback', 'N/A')}\n\n")
-
-            f.write("SUGGESTIONS:\n")
-            for suggestion in entry.get('suggestions', []):
-                f.write(f"- {suggestion}\n")
-            f.write("\n")
-
-            f.write(f"REVISED OUTPUT:\n{entry.get('revised_output', 'N/A')}\n\n")
-
-            f.write(f"{'='*50}\n\n")
+            f.write(render_revision_history_entry(entry))
 
 
 def write_structured_output(history_log: List[Dict[str, Any]], output_file: str = 'structured_output.md'):
@@ -45,32 +83,84 @@ def write_structured_output(history_log: List[Dict[str, Any]], output_file: str
     os.makedirs(output_dir, exist_ok=True)
 
     with open(os.path.join(output_dir, output_file), 'w') as f:
-        f.write("# Revision Process Output\n\n")
-        f.write("## Revision History\n\n")
+        f.write(STRUCTURED_OUTPUT_HEADER)
 
-        for entry in history_log:
-            f.write(f"### Iteration {entry.get('iteration', 'N/A')}\n\n")
-
-            if 'evaluation' in entry and entry['evaluation']:
-                f.write("#### Evaluation\n\n")
-                f.write(f"- Overall Score: {entry['evaluation'].get('overall_score', 'N/A')}\n")
-                f.write("- Aspect Scores:\n")
-                for aspect, score in entry['evaluation'].get('aspect_scores', {}).items():
-                    f.write(f"  - {aspect}: {score}\n")
-                f.write("\n")
-
-                f.write("#### Reasoning\n\n")
-                f.write(f"{entry['evaluation'].get('combined_reasoning', 'N/A')}\n\n")
+        for index, entry in enumerate(history_log):
+            if index:
+                f.write(STRUCTURED_OUTPUT_SEPARATOR)  # Separator between iterations
+            f.write(render_structured_entry(entry))
 
-            f.write("#### Suggestions\n\n")
-            for suggestion in entry.get('suggestions', []):
-                f.write(f"- {suggestion}\n")
-            f.write("\n")
-
-            f.write("#### Revised Output\n\n")
-            f.write(f"```\n{entry.get('revised_output', 'N/A')}\n```\n\n")
+    print(f"Structured output has been written to {os.path.join(output_dir, output_file)}")
 
-            if entry != history_log[-1]:
-                f.write("---\n\n")  # Separator between iterations
 
-    print(f"Structured output has been written to {os.path.join(output_dir, output_file)}")
+class OutputSink:
+    def write_iteration(self, entry: Dict[str, Any]):
+        raise NotImplementedError
+
+    def close(self, final_output: str):
+        raise NotImplementedError
+
+
+class FileOutputSink(OutputSink):
+    def __init__(self,
+                 output_dir: str = config['output']['directory'],
+                 debug: bool = False,
+                 structured_file: str = 'structured_output.md',
+                 fsync: str = config['output']['fsync'],
+                 buffer_size: int = config['output']['buffer_size']):
+        if fsync not in ('never', 'iteration', 'close'):
+            raise ValueError(f"Unsupported fsync policy: {fsync}")
+        self.output_dir = output_dir
+        self.debug = debug
+        self.structured_file = structured_file
+        self.fsync = fsync
+        self.buffer_size = buffer_size
+        self.iterations_written = 0
+        self.closed = False
+
+        os.makedirs(output_dir, exist_ok=True)
+        self._structured = self._open(structured_file)
+        self._structured.write(STRUCTURED_OUTPUT_HEADER)
+        self._history_jsonl = self._open('history.jsonl')
+        self._revision_history: Optional[TextIO] = self._open('revision_history.txt') if debug else None
+
+    def _open(self, file_name: str) -> TextIO:
+        return open(os.path.join(self.output_dir, file_name), 'w', buffering=self.buffer_size)
+
+    @property
+    def _files(self) -> List[TextIO]:
+        return [f for f in (self._structured, self._history_jsonl, self._revision_history) if f is not None]
+
+    def write_iteration(self, entry: Dict[str, Any]):
+        if self.iterations_written:
+            self._structured.write(STRUCTURED_OUTPUT_SEPARATOR)
+        self._structured.write(render_structured_entry(entry))
+        self._history_jsonl.write(json.dumps(entry, default=str) + '\n')
+        if self._revision_history:
+            self._revision_history.write(render_revision_history_entry(entry))
+        self.iterations_written += 1
+
+        if self.fsync == 'iteration':
+            self._sync()
+
+    def close(self, final_output: str):
+        if self.closed:
+            return
+        if self.debug:
+            with open(os.path.join(self.output_dir, 'final_output.txt'), 'w') as f:
+                f.write(final_output)
+                if self.fsync != 'never':
+                    f.flush()
+                    os.fsync(f.fileno())
+
+        if self.fsync != 'never':
+            self._sync()
+        for f in self._files:
+            f.close()
+        self.closed = True
+        print(f"Structured output has been written to {os.path.join(self.output_dir, self.structured_file)}")
+
+    def _sync(self):
+        for f in self._files:
+            f.flush()
+            os.fsync(f.fileno())
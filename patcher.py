@@ -0,0 +1,144 @@
+import re
+from difflib import SequenceMatcher
+from typing import List, Tuple
+from pydantic import BaseModel
+
+EDITS_HEADER = 'EDITS:'
+EDITS_END = 'END OF EDITS'
+
+_EDIT_BLOCK = re.compile(r'^<<<\s*(MODIFY|REMOVE|ADD AFTER|ADD BEFORE|ADD)\s*\n(.*?)\n?^>>>\s*$',
+                         re.MULTILINE | re.DOTALL)
+_SEPARATOR = re.compile(r'^===\s*$', re.MULTILINE)
+
+
+class PatchError(Exception):
+    pass
+
+
+class Edit(BaseModel):
+    operation: str
+    target: str = ""
+    content: str = ""
+
+    def summary(self) -> str:
+        if self.operation == 'MODIFY':
+            return f"MODIFY: {self.target} -> {self.content}"
+        if self.operation == 'REMOVE':
+            return f"REMOVE: {self.target}"
+        return f"ADD: {self.content}"
+
+
+def parse_patch_result(patch_result: str) -> Tuple[List[str], List[Edit]]:
+    if EDITS_HEADER not in patch_result:
+        raise PatchError("Response has no EDITS section")
+
+    head, body = patch_result.split(EDITS_HEADER, 1)
+    body = body.split(EDITS_END, 1)[0]
+
+    edits = []
+    for match in _EDIT_BLOCK.finditer(body):
+        operation, block = match.group(1), match.group(2)
+        parts = _SEPARATOR.split(block, maxsplit=1)
+        if operation in ('MODIFY', 'ADD AFTER', 'ADD BEFORE'):
+            if len(parts) != 2:
+                raise PatchError(f"{operation} edit is missing its '===' separator")
+            edits.append(Edit(operation=operation, target=parts[0].strip('\n'), content=parts[1].strip('\n')))
+        elif operation == 'REMOVE':
+            edits.append(Edit(operation=operation, target=block.strip('\n')))
+        else:
+            edits.append(Edit(operation=operation, content=block.strip('\n')))
+
+    suggestions = [line.strip() for line in head.split('SUGGESTIONS:', 1)[-1].split('\n')
+                   if line.strip()] if 'SUGGESTIONS:' in head else []
+
+    # An empty edit list would leave the document unchanged, so anything the model meant as edits must parse
+    if not edits and (body.strip() or suggestions):
+        raise PatchError("EDITS section contains no well-formed edit blocks")
+    return suggestions or [edit.summary() for edit in edits], edits
+
+
+def apply_edits(document: str, edits: List[Edit], threshold: float = 0.85) -> str:
+    for edit in edits:
+        if edit.operation == 'ADD':
+            document = f"{document.rstrip()}\n{edit.content}" if document.strip() else edit.content
+            continue
+
+        if not edit.target.strip():
+            raise PatchError(f"{edit.operation} edit has an empty target")
+        start, end = locate(document, edit.target, threshold)
+
+        if edit.operation == 'MODIFY':
+            document = document[:start] + edit.content + document[end:]
+        elif edit.operation == 'REMOVE':
+            if (start == 0 or document[start - 1] == '\n') and document[end:end + 1] == '\n':
+                end += 1
+            document = document[:start] + document[end:]
+        elif edit.operation == 'ADD AFTER':
+            document = document[:end] + '\n' + edit.content + document[end:]
+        elif edit.operation == 'ADD BEFORE':
+            document = document[:start] + edit.content + '\n' + document[start:]
+    return document
+
+
+def locate(document: str, target: str, threshold: float = 0.85) -> Tuple[int, int]:
+    start = document.find(target)
+    if start != -1:
+        return start, start + len(target)
+
+    span = _locate_normalized(document, target)
+    if span:
+        return span
+
+    span = _locate_fuzzy(document, target, threshold)
+    if span:
+        return span
+
+    raise PatchError(f"Could not locate edit target: {target[:80]!r}")
+
+
+def _locate_normalized(document: str, target: str):
+    # Collapse whitespace runs while remembering where each normalized character came from
+    normalized_chars, positions = [], []
+    previous_space = False
+    for index, char in enumerate(document):
+        if char.isspace():
+            if previous_space:
+                continue
+            normalized_chars.append(' ')
+            previous_space = True
+        else:
+            normalized_chars.append(char)
+            previous_space = False
+        positions.append(index)
+
+    normalized_target = ' '.join(target.split())
+    start = ''.join(normalized_chars).find(normalized_target)
+    if start == -1 or not normalized_target:
+        return None
+    end = start + len(normalized_target) - 1
+    return positions[start], positions[end] + 1
+
+
+def _locate_fuzzy(document: str, target: str, threshold: float):
+    lines = document.split('\n')
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line) + 1)
+
+    target_lines = target.strip('\n').split('\n')
+    target_text = '\n'.join(line.strip() for line in target_lines)
+    best_ratio, best_span = 0.0, None
+    for window in {max(1, len(target_lines) - 1), len(target_lines), len(target_lines) + 1}:
+        for first in range(0, max(1, len(lines) - window + 1)):
+            candidate = '\n'.join(line.strip() for line in lines[first:first + window])
+            matcher = SequenceMatcher(None, candidate, target_text, autojunk=False)
+            if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio > best_ratio:
+                last = min(first + window, len(lines))
+                best_ratio, best_span = ratio, (offsets[first], offsets[last] - 1)
+
+    if best_ratio >= threshold:
+        return best_span
+    return None
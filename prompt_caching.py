@@ -0,0 +1,27 @@
+from typing import Any, Dict, List, Optional
+
+from langchain_anthropic import ChatAnthropic
+from langchain_core.language_models import LanguageModelInput
+
+PROMPT_CACHING_BETA = "prompt-caching-2024-07-31"
+EPHEMERAL_CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def mark_cacheable_prefix(payload: Dict[str, Any]) -> Dict[str, Any]:
+    # The prompts keep everything that is stable within a run in the system message, so a single breakpoint at its
+    # end caches the whole prefix
+    system = payload.get("system")
+    if isinstance(system, str) and system:
+        payload["system"] = [{"type": "text", "text": system, "cache_control": EPHEMERAL_CACHE_CONTROL}]
+    return payload
+
+
+class CachingChatAnthropic(ChatAnthropic):
+    # langchain-anthropic 0.1.x rebuilds content blocks without cache_control, so the marker is added to the final
+    # request payload instead of the prompt messages
+    def _get_request_payload(self,
+                             input_: LanguageModelInput,
+                             *,
+                             stop: Optional[List[str]] = None,
+                             **kwargs: Dict) -> Dict:
+        return mark_cacheable_prefix(super()._get_request_payload(input_, stop=stop, **kwargs))
@@ -1,4 +1,15 @@
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+# The original task never changes during a run, so it closes the system message. Everything up to and including
+# it is a byte-identical prefix across iterations of the same prompt (each evaluation aspect has its own, since the
+# aspect instructions come first) that provider-side prompt caches can reuse.
+STABLE_CONTEXT_PROMPT = """
+
+The content under review was produced for the following task, which stays the same across all iterations:
+
+System Prompt: {system_prompt}
+
+User Input: {user_input}"""
 
 FEEDBACK_PROMPT = ChatPromptTemplate.from_messages([
     ("system", """You are an expert content reviewer tasked with providing constructive feedback to improve the quality of AI-generated content. Your feedback should be specific, actionable, and based on the evaluation results provided.
@@ -14,12 +25,8 @@ Instructions:
 4. Highlight any missing elements or superfluous information.
 5. If applicable, comment on improvements or regressions compared to the previous output.
 
-Your feedback should be detailed yet concise, providing clear directions for improvement."""),
-    ("human", """Context and Requirements: {system_prompt}
-
-User Input: {user_input}
-
-Current Output: {current_output}
+Your feedback should be detailed yet concise, providing clear directions for improvement.""" + STABLE_CONTEXT_PROMPT),
+    ("human", """Current Output: {current_output}
 
 Evaluation Results:
 Overall Score: {evaluation_overall_score}
@@ -53,12 +60,40 @@ SUGGESTIONS:
 [List your specific suggestions here]
 
 REVISED OUTPUT:
-[Provide the full revised output here]"""),
-    ("human", """System Prompt: {system_prompt}
+[Provide the full revised output here]
+END OF REVISED OUTPUT""" + STABLE_CONTEXT_PROMPT),
+    ("human", """Current Output: {current_output}
+
+Evaluation Results:
+Overall Score: {evaluation_overall_score}
+Aspect Scores: {evaluation_aspect_scores}
+Reasoning: {evaluation_combined_reasoning}
 
-User Input: {user_input}
+Feedback: {feedback}
 
-Current Output: {current_output}
+Please provide your suggestions and a revised version of the output, addressing all the points raised in the evaluation and feedback:"""),
+])
+
+STRUCTURED_REVISION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are an AI assistant tasked with improving content based on expert feedback and evaluation. Your goal is to address all the points raised in the feedback while maintaining or enhancing the overall quality of the output.
+
+Instructions:
+1. Carefully read the original system prompt, user input, current output, evaluation results, and feedback.
+2. Provide specific suggestions for improvement in the following format:
+   ADD: [content to add]
+   REMOVE: [content to remove]
+   MODIFY: [original content] -> [modified content]
+3. After providing suggestions, rewrite the entire output, incorporating all improvements.
+4. Ensure that your revised output:
+   - Is highly relevant to the user's input and system prompt
+   - Maintains logical flow and clarity
+   - Provides accurate and factual information
+   - Improves upon the aspects that scored low in the evaluation
+   - Maintains or enhances simplicity and conciseness
+
+Your response must be a single JSON object in this exact format, with no text before or after it:
+{{"suggestions": ["<one specific suggestion>", "..."], "revised_output": "<the full revised output>"}}""" + STABLE_CONTEXT_PROMPT),
+    ("human", """Current Output: {current_output}
 
 Evaluation Results:
 Overall Score: {evaluation_overall_score}
@@ -67,7 +102,57 @@ Reasoning: {evaluation_combined_reasoning}
 
 Feedback: {feedback}
 
-Please provide your suggestions and a revised version of the output, addressing all the points raised in the evaluation and feedback:"""),
+Please respond with the JSON object containing your suggestions and the revised version of the output, addressing all the points raised in the evaluation and feedback:"""),
+])
+
+PATCH_REVISION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are an AI assistant tasked with improving content based on expert feedback and evaluation. Your goal is to address all the points raised in the feedback while maintaining or enhancing the overall quality of the output.
+
+Instructions:
+1. Carefully read the original system prompt, user input, current output, evaluation results, and feedback.
+2. Briefly list your specific suggestions for improvement.
+3. Express every improvement as an edit to the current output. Do NOT rewrite the entire output.
+4. Each edit must quote text exactly as it appears in the current output, long enough to be unique:
+<<<MODIFY
+[original content]
+===
+[modified content]
+>>>
+<<<REMOVE
+[content to remove]
+>>>
+<<<ADD AFTER
+[existing content to insert after]
+===
+[content to add]
+>>>
+<<<ADD
+[content to append at the end]
+>>>
+5. Ensure that the edited output:
+   - Is highly relevant to the user's input and system prompt
+   - Maintains logical flow and clarity
+   - Provides accurate and factual information
+   - Improves upon the aspects that scored low in the evaluation
+   - Maintains or enhances simplicity and conciseness
+
+Your response should be structured as follows:
+SUGGESTIONS:
+[List your specific suggestions here]
+
+EDITS:
+[Your edit blocks here]
+END OF EDITS""" + STABLE_CONTEXT_PROMPT),
+    ("human", """Current Output: {current_output}
+
+Evaluation Results:
+Overall Score: {evaluation_overall_score}
+Aspect Scores: {evaluation_aspect_scores}
+Reasoning: {evaluation_combined_reasoning}
+
+Feedback: {feedback}
+
+Please provide your suggestions and the edits to the current output, addressing all the points raised in the evaluation and feedback:"""),
 ])
 
 EVALUATION_SYSTEM_PROMPTS = {
@@ -137,9 +222,51 @@ Reasoning: The output maintains the core message but adds unnecessary details li
 
 EVALUATION_USER_PROMPT = """Evaluate the following output based on {aspect}:
 
-System Prompt: {system_prompt}
-User Input: {user_input}
 Current Output: {current_output}
 Previous Output (if available): {previous_output}
 
-Remember to provide a score from 0 to 100 and explain your reasoning in detail, using the format specified in your instructions."""
\ No newline at end of file
+Remember to provide a score from 0 to 100 and explain your reasoning in detail, using the format specified in your instructions."""
+
+EVALUATION_ASPECT_CRITERIA = {
+    "relevance": "How well the output addresses the user's input and adheres to the system prompt.",
+    "coherence": "The logical flow, structure, transitions and overall readability of the output.",
+    "accuracy": "How well the output follows the format, required sections and goals specified in the system prompt.",
+    "simplicity": "Whether the output stays clear and concise, avoiding unnecessary complexity, details or verbose language compared to the previous output."
+}
+
+BATCHED_EVALUATION_SYSTEM_PROMPT = """You are an expert content evaluator. Your task is to assess the given output on several aspects at once, scoring each aspect independently.
+
+Aspects to evaluate:
+{aspect_criteria}
+
+Instructions:
+1. Carefully read the system prompt, user input, current output and previous output (if available).
+2. Evaluate each aspect on a scale from 0 to 100, judging it on its own criteria only.
+3. Provide a detailed reasoning for each score, using specific examples from the text.
+
+Your response must be a single JSON object with one key per aspect, in this exact format:
+{{"<aspect>": {{"score": <integer from 0 to 100>, "reasoning": "<your detailed explanation>"}}}}
+
+Example:
+{{"relevance": {{"score": 85, "reasoning": "The output addresses the main points of the user's question but does not use the requested simple terms."}}, "coherence": {{"score": 90, "reasoning": "The structure is clear and transitions are smooth; the conclusion could tie back to the main question."}}}}"""
+
+BATCHED_EVALUATION_USER_PROMPT = """Evaluate the following output on these aspects: {aspects}
+
+Current Output: {current_output}
+Previous Output (if available): {previous_output}
+
+Remember to score every listed aspect from 0 to 100 and respond with the JSON object specified in your instructions."""
+
+EVALUATION_JSON_FORMAT_PROMPT = """
+
+Instead of the Score and Reasoning lines above, your response must be a single JSON object in this exact format:
+{"score": <integer from 0 to 100>, "reasoning": "<your detailed explanation>"}"""
+
+REASK_PROMPT = """Your previous response could not be used: {error}
+
+Respond again with only a JSON object containing these fields: {fields}. Follow the same instructions as before for their content and leave out every other field."""
+
+REASK_CHAT_PROMPT = ChatPromptTemplate.from_messages([
+    MessagesPlaceholder("conversation"),
+    ("human", REASK_PROMPT),
+])
@@ -0,0 +1,46 @@
+from typing import Any, Callable, Dict
+
+from langchain_core.language_models import BaseChatModel
+
+ProviderFactory = Callable[[str, Dict[str, Any]], BaseChatModel]
+
+_providers: Dict[str, ProviderFactory] = {}
+
+
+def register_provider(name: str, factory: ProviderFactory):
+    _providers[name] = factory
+
+
+def registered_providers():
+    return sorted(_providers)
+
+
+def create_llm(provider: str, model_name: str, config: Dict[str, Any]) -> BaseChatModel:
+    factory = _providers.get(provider)
+    if factory is None:
+        raise ValueError(f"Unsupported model provider: {provider}")
+    return factory(model_name, config)
+
+
+# Provider SDKs are imported inside the factories so a process only pays for the ones it uses
+def _openai(model_name: str, config: Dict[str, Any]) -> BaseChatModel:
+    from langchain_openai import ChatOpenAI
+
+    # Retries are handled by the shared RateLimiter so they respect the provider-wide budget
+    return ChatOpenAI(model=model_name, api_key=config['env']['OPENAI_API_KEY'], max_retries=0)
+
+
+def _anthropic(model_name: str, config: Dict[str, Any]) -> BaseChatModel:
+    if config['llm'].get('prompt_caching'):
+        from prompt_caching import CachingChatAnthropic, PROMPT_CACHING_BETA
+
+        return CachingChatAnthropic(model=model_name, api_key=config['env']['ANTHROPIC_API_KEY'], max_retries=0,
+                                    default_headers={"anthropic-beta": PROMPT_CACHING_BETA})
+
+    from langchain_anthropic import ChatAnthropic
+
+    return ChatAnthropic(model=model_name, api_key=config['env']['ANTHROPIC_API_KEY'], max_retries=0)
+
+
+register_provider('openai', _openai)
+register_provider('anthropic', _anthropic)
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+import aiohttp
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class RetryableError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class RateLimitError(RetryableError):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+
+    async def acquire(self, amount: float = 1.0):
+        amount = min(amount, self.capacity)
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.refill_per_second)
+            self._updated = now
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.refill_per_second)
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class RateLimiter:
+    def __init__(self,
+                 limits: Optional[Dict[str, Dict[str, Dict[str, float]]]] = None,
+                 max_retries: int = config['rate_limits']['max_retries'],
+                 base_delay: float = config['rate_limits']['base_delay'],
+                 max_delay: float = config['rate_limits']['max_delay'],
+                 headroom: float = config['rate_limits']['headroom'],
+                 burst_seconds: float = config['rate_limits']['burst_seconds']):
+        self.limits = config['rate_limits']['providers'] if limits is None else limits
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.headroom = headroom
+        self.burst_seconds = burst_seconds
+        self._buckets: Dict[Tuple[str, str], Tuple[Optional[TokenBucket], Optional[TokenBucket]]] = {}
+
+    def _get_buckets(self, provider: str, model: str) -> Tuple[Optional[TokenBucket], Optional[TokenBucket]]:
+        provider_limits = self.limits.get(provider) or {}
+        key = (provider, model) if model in provider_limits else (provider, 'default')
+        if key not in self._buckets:
+            model_limits = provider_limits.get(key[1]) or {}
+            self._buckets[key] = (self._make_bucket(model_limits.get('requests_per_minute')),
+                                  self._make_bucket(model_limits.get('tokens_per_minute')))
+        return self._buckets[key]
+
+    def _make_bucket(self, per_minute: Optional[float]) -> Optional[TokenBucket]:
+        if not per_minute:
+            return None
+        rate = per_minute * self.headroom / 60.0
+        return TokenBucket(capacity=max(1.0, rate * self.burst_seconds), refill_per_second=rate)
+
+    async def acquire(self, provider: str, model: str, tokens: int = 0):
+        request_bucket, token_bucket = self._get_buckets(provider, model)
+        if request_bucket:
+            await request_bucket.acquire(1)
+        if token_bucket and tokens:
+            await token_bucket.acquire(tokens)
+
+    async def call(self,
+                   provider: str,
+                   model: str,
+                   func: Callable[[], Awaitable[T]],
+                   tokens: int = 0,
+                   span: Any = None) -> T:
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(provider, model, tokens)
+            try:
+                return await func()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                retry_after = get_retry_after(e)
+                if retry_after:
+                    # Hold back every caller sharing this quota, not just the one that was rejected
+                    for bucket in self._get_buckets(provider, model):
+                        if bucket:
+                            bucket.block(retry_after)
+                delay = self.backoff(attempt, retry_after)
+                if span is not None:
+                    span.retries += 1
+                logger.warning(f"{provider}/{model} call failed ({type(e).__name__}: {str(e)}); "
+                               f"retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(delay)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after:
+            delay = max(delay, retry_after + random.uniform(0, self.base_delay))
+        return delay
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (RetryableError, aiohttp.ClientConnectionError, asyncio.TimeoutError)):
+        return True
+    status = getattr(error, 'status_code', None) or getattr(error, 'status', None)
+    return status == 429 or (isinstance(status, int) and status >= 500)
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    if isinstance(error, RetryableError):
+        return error.retry_after
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    return parse_retry_after(headers.get('retry-after')) if headers else None
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
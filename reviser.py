@@ -1,25 +1,62 @@
+import asyncio
+import inspect
 import logging
-from typing import List, Optional, Tuple, Dict, Any
-from pydantic import BaseModel
+import time
+from contextlib import nullcontext
+from difflib import SequenceMatcher
+from functools import partial
+from typing import List, Optional, Tuple, Dict, Any, AsyncIterator, AsyncIterable, Awaitable, Iterable, Sequence, \
+    Union, Callable, TypeVar, Literal
+from pydantic import BaseModel, Field
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
+from budget import BUDGET_STOP_REASONS, DEADLINE_REACHED, BudgetTracker, BudgetUsage, RunBudget
+from cache import ResultCache, make_cache_key
+from concurrency import ProviderLimiter
+from context_budget import BUDGETED_FIELDS, ContextBudget, build_context_budget
+from hedging import AlternateModel, Hedger
+from history_store import HistoryLog, RevisionHistory
+from journal import RevisionJournal
+from output_handler import OutputSink
+from instrumentation import TokenUsageCallback, instrumentation
+from rate_limiter import RateLimiter, estimate_tokens
 from config import config
-from prompts import FEEDBACK_PROMPT, REVISION_PROMPT
+from evaluator import AggregatedEvaluationResult, merge_carried_aspects
+from patcher import PatchError, apply_edits, parse_patch_result
+from prompts import (FEEDBACK_PROMPT, REVISION_PROMPT, PATCH_REVISION_PROMPT, STRUCTURED_REVISION_PROMPT, REASK_PROMPT,
+                     REASK_CHAT_PROMPT)
+from stopping import StoppingPolicy, build_stopping_policy, is_comparable
+from stream_parser import RevisionStreamParser, RevisionStreamEvent
+from structured_output import parse_structured, parse_with_reasks
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+T = TypeVar('T')
+
 
 class RevisionInput(BaseModel):
     system_prompt: str
     user_input: str
     initial_output: Optional[str] = None
+    job_id: Optional[str] = None
 
 
 class EvaluationResult(BaseModel):
     overall_score: float
     aspect_scores: Dict[str, float]
     combined_reasoning: str
+    failed_aspects: List[str] = []
+    aspect_reasoning: Dict[str, str] = {}
+    aspect_sources: Dict[str, str] = {}
+
+
+class RevisionOutput(BaseModel):
+    suggestions: List[str] = []
+    revised_output: str = Field(..., min_length=1)
 
 
 class IterationResult(BaseModel):
@@ -29,14 +66,115 @@ class IterationResult(BaseModel):
     suggestions: List[str] = []
     revised_output: str = ""
     evaluation: Optional[EvaluationResult] = None
+    speculation: Dict[str, Any] = {}
 
 
 class RevisionResult(BaseModel):
     final_output: str
-    revision_history: List[str]
+    revision_history: RevisionHistory
     evaluation_history: List[EvaluationResult]
     final_suggestions: List[str]
-    history_log: List[Dict[str, Any]]
+    history_log: HistoryLog
+    stop_reason: str = ""
+    speculation: List[Dict[str, Any]] = []
+    job_id: Optional[str] = None
+    error: Optional[str] = None
+    budget_usage: Optional[BudgetUsage] = None
+
+    def model_post_init(self, __context: Any):
+        self.history_log = self.history_log.sharing(self.revision_history)
+
+
+class RevisionEvent(BaseModel):
+    type: str
+    iteration: int
+
+
+class EvaluationEvent(RevisionEvent):
+    type: Literal["evaluation"] = "evaluation"
+    evaluation: EvaluationResult
+
+
+class FeedbackEvent(RevisionEvent):
+    type: Literal["feedback"] = "feedback"
+    feedback: str
+
+
+class RevisedEvent(RevisionEvent):
+    type: Literal["revision"] = "revision"
+    suggestions: List[str]
+    revised_output: str
+
+
+class StoppedEvent(RevisionEvent):
+    type: Literal["stopped"] = "stopped"
+    stop_reason: str
+    result: RevisionResult
+
+
+class RevisionState(BaseModel):
+    revision_history: RevisionHistory
+    evaluation_history: List[EvaluationResult] = []
+    history_log: HistoryLog = Field(default_factory=HistoryLog)
+    speculation: List[Dict[str, Any]] = []
+    suggestions: List[str] = []
+    completed_iterations: int = 0
+    stop_reason: Optional[str] = None
+
+    def model_post_init(self, __context: Any):
+        self.history_log = self.history_log.sharing(self.revision_history)
+
+    @property
+    def current_output(self) -> str:
+        return self.revision_history[-1]
+
+    @property
+    def previous_output(self) -> Optional[str]:
+        return self.revision_history[-2] if len(self.revision_history) > 1 else None
+
+    def apply(self, iteration_result: IterationResult):
+        self.completed_iterations += 1
+        self.suggestions = iteration_result.suggestions
+        if iteration_result.speculation:
+            self.speculation.append({"iteration": self.completed_iterations, **iteration_result.speculation})
+        if iteration_result.evaluation:
+            self.evaluation_history.append(iteration_result.evaluation)
+        if iteration_result.should_stop:
+            self.stop_reason = iteration_result.stop_reason
+        else:
+            self.revision_history.append(iteration_result.revised_output)
+        # Appended after the revision so the log can reference it instead of keeping a second copy
+        self.history_log.append(iteration_result.log_entry)
+
+
+class BeamSettings(BaseModel):
+    enabled: bool = config['reviser']['beam']['enabled']
+    candidates: int = config['reviser']['beam']['candidates']
+    keep: int = config['reviser']['beam']['keep']
+    sample_feedback: bool = config['reviser']['beam']['sample_feedback']
+    max_calls_per_iteration: int = config['reviser']['beam']['max_calls_per_iteration']
+
+
+class SpeculationSettings(BaseModel):
+    feedback: bool = config['reviser']['speculation']['feedback']
+    evaluation: bool = config['reviser']['speculation']['evaluation']
+    max_score_drift: float = config['reviser']['speculation']['max_score_drift']
+
+
+class IncrementalEvaluationSettings(BaseModel):
+    enabled: bool = config['reviser']['incremental_evaluation']['enabled']
+    max_edit_ratio: float = config['reviser']['incremental_evaluation']['max_edit_ratio']
+    min_carry_score: float = config['reviser']['incremental_evaluation']['min_carry_score']
+    full_rescore_every: int = config['reviser']['incremental_evaluation']['full_rescore_every']
+
+
+class BeamCandidate(BaseModel):
+    output: str
+    previous_output: Optional[str] = None
+    evaluation: Optional[EvaluationResult] = None
+    feedback: str = ""
+    suggestions: List[str] = []
+    iteration: int = 0
 
 
 class Reviser:
@@ -45,94 +183,611 @@ class Reviser:
             agent_llm: BaseChatModel,
             reviser_llm: BaseChatModel,
             evaluator: Any = None,
-            max_iterations: int = config['reviser']['max_iterations']
+            max_iterations: int = config['reviser']['max_iterations'],
+            limiter: Optional[ProviderLimiter] = None,
+            agent_provider: str = config['llm']['agent_model']['provider'],
+            reviser_provider: str = config['llm']['reviser_model']['provider'],
+            cache: Optional[ResultCache] = None,
+            beam: Optional[BeamSettings] = None,
+            stream_revisions: bool = config['reviser']['stream_revisions'],
+            revision_listener: Optional[Callable[[RevisionStreamEvent], Any]] = None,
+            revision_mode: str = config['reviser']['revision_mode'],
+            patch_match_threshold: float = config['reviser']['patch_match_threshold'],
+            stopping_policy: Optional[StoppingPolicy] = None,
+            return_best: bool = config['reviser']['return_best'],
+            speculation: Optional[SpeculationSettings] = None,
+            rate_limiter: Optional[RateLimiter] = None,
+            journal: Optional[RevisionJournal] = None,
+            context_budget: Optional[ContextBudget] = None,
+            incremental_evaluation: Optional[IncrementalEvaluationSettings] = None,
+            hedger: Optional[Hedger] = None,
+            alternate_agent: Optional[AlternateModel] = None,
+            alternate_reviser: Optional[AlternateModel] = None,
+            budget: Optional[RunBudget] = None,
+            structured_output: bool = config['structured_output']['revision'],
+            max_reasks: int = config['structured_output']['max_reasks']
     ):
         self.agent_llm = agent_llm
         self.reviser_llm = reviser_llm
         self.evaluator = evaluator
         self.max_iterations = max_iterations
+        self.limiter = limiter or ProviderLimiter()
+        self.agent_provider = agent_provider
+        self.reviser_provider = reviser_provider
+        self.cache = cache
+        self.beam = beam or BeamSettings()
+        self.stream_revisions = stream_revisions
+        self.revision_listener = revision_listener
+        self.revision_mode = revision_mode
+        self.patch_match_threshold = patch_match_threshold
+        self.stopping_policy = stopping_policy or build_stopping_policy()
+        self.return_best = return_best
+        self.speculation = speculation or SpeculationSettings()
+        self.rate_limiter = rate_limiter
+        self.journal = journal
+        self.context_budget = context_budget or build_context_budget()
+        self.incremental_evaluation = incremental_evaluation or IncrementalEvaluationSettings()
+        self.hedger = hedger
+        self.alternate_agent = alternate_agent
+        self.alternate_reviser = alternate_reviser
+        self.budget = budget or RunBudget()
+        self.structured_output = structured_output
+        self.max_reasks = max_reasks
         self.feedback_chain = FEEDBACK_PROMPT | self.reviser_llm | StrOutputParser()
         self.revision_chain = REVISION_PROMPT | self.agent_llm | StrOutputParser()
+        self.patch_chain = PATCH_REVISION_PROMPT | self.agent_llm | StrOutputParser()
+        self.structured_revision_chain = STRUCTURED_REVISION_PROMPT | self.agent_llm | StrOutputParser()
+        self.reask_chain = REASK_CHAT_PROMPT | self.agent_llm | StrOutputParser()
+
+    async def revise(self,
+                     revision_input: RevisionInput,
+                     run_id: Optional[str] = None,
+                     output_sink: Optional[OutputSink] = None,
+                     budget: Optional[RunBudget] = None) -> RevisionResult:
+        with self._hedge_budget():
+            if self.beam.enabled:
+                result = await self.revise_beam(revision_input, budget)
+                if output_sink:
+                    for entry in result.history_log:
+                        output_sink.write_iteration(entry)
+                    output_sink.close(result.final_output)
+                return result
+
+            run_id = run_id or revision_input.job_id
+            state = self._start_run(revision_input, run_id)
+            return await self._run(revision_input, state, run_id, output_sink, budget)
+
+    def revise_stream(self,
+                      revision_input: RevisionInput,
+                      run_id: Optional[str] = None,
+                      output_sink: Optional[OutputSink] = None,
+                      budget: Optional[RunBudget] = None) -> "RevisionStream":
+        if self.beam.enabled:
+            raise ValueError("Beam revision does not support streaming iteration events")
+        return RevisionStream(self, revision_input, run_id or revision_input.job_id, output_sink, budget)
+
+    def _start_run(self, revision_input: RevisionInput, run_id: Optional[str]) -> RevisionState:
+        if self.journal and run_id:
+            self.journal.start(run_id, revision_input.model_dump())
+        return RevisionState(revision_history=[revision_input.initial_output or "No initial output provided."])
+
+    async def resume(self,
+                     run_id: str,
+                     output_sink: Optional[OutputSink] = None,
+                     budget: Optional[RunBudget] = None) -> RevisionResult:
+        if not self.journal:
+            raise ValueError("Resuming a run requires a journal")
+
+        finished = self.journal.load_result(run_id)
+        if finished is not None:
+            result = RevisionResult(**finished)
+            # The caller's sink has already truncated its files, so the finished run is written out again
+            if output_sink:
+                for entry in result.history_log:
+                    output_sink.write_iteration(entry)
+                output_sink.close(result.final_output)
+            return result
+
+        journal_state = self.journal.load(run_id)
+        if journal_state is None or journal_state['input'] is None:
+            raise ValueError(f"No journal found for run {run_id}")
 
-    async def revise(self, revision_input: RevisionInput) -> RevisionResult:
-        current_output = revision_input.initial_output or "No initial output provided."
-        revision_history = [current_output]
-        evaluation_history = []
+        revision_input = RevisionInput(**journal_state['input'])
+        state = RevisionState(revision_history=[revision_input.initial_output or "No initial output provided."])
+        for record in journal_state['iterations']:
+            state.apply(IterationResult(**record))
+        logger.info(f"Resuming run {run_id} after {state.completed_iterations} completed iteration(s)")
+        if output_sink:
+            for entry in state.history_log:
+                output_sink.write_iteration(entry)
+        with self._hedge_budget():
+            return await self._run(revision_input, state, run_id, output_sink, budget)
+
+    def _hedge_budget(self):
+        return self.hedger.run_budget() if self.hedger else nullcontext()
+
+    @staticmethod
+    async def _within_budget(tracker: BudgetTracker, awaitable: Awaitable[T]) -> Optional[T]:
+        task = asyncio.ensure_future(awaitable)
+        exhausted = asyncio.ensure_future(tracker.exhausted.wait())
+        try:
+            done, _ = await asyncio.wait({task, exhausted}, timeout=tracker.remaining_seconds(),
+                                         return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            exhausted.cancel()
+            if not task.done():
+                # Cancelling the iteration cancels its in-flight chain and evaluator calls
+                task.cancel()
+                await asyncio.wait({task})
+        return task.result() if task in done else None
+
+    async def _run(self,
+                   revision_input: RevisionInput,
+                   state: RevisionState,
+                   run_id: Optional[str],
+                   output_sink: Optional[OutputSink] = None,
+                   budget: Optional[RunBudget] = None,
+                   event_listener: Optional[Callable[[RevisionEvent], Any]] = None,
+                   tracker: Optional[BudgetTracker] = None) -> RevisionResult:
+        pending_evaluation = None
+        result = None
+        tracker = tracker or BudgetTracker(budget or self.budget)
+
+        try:
+            with tracker.activate():
+                for i in range(state.completed_iterations, self.max_iterations):
+                    if state.stop_reason:
+                        break
+                    state.stop_reason = tracker.stop_reason()
+                    if state.stop_reason:
+                        logger.warning(f"{state.stop_reason} before revision iteration {i + 1}")
+                        break
+                    logger.info(f"Starting revision iteration {i + 1}")
+
+                    iteration_result = await self._within_budget(tracker, self._perform_iteration(
+                        revision_input=revision_input,
+                        current_output=state.current_output,
+                        previous_output=state.previous_output,
+                        iteration=i + 1,
+                        evaluation_history=state.evaluation_history,
+                        pending_evaluation=pending_evaluation,
+                        event_listener=event_listener
+                    ))
+                    if iteration_result is None:
+                        state.stop_reason = tracker.stop_reason() or DEADLINE_REACHED
+                        logger.warning(f"{state.stop_reason} during revision iteration {i + 1}; "
+                                       f"returning the best revision so far")
+                        break
+                    pending_evaluation = None
+                    state.apply(iteration_result)
+                    if not iteration_result.should_stop:
+                        # Sent once the revision is in the state, so a consumer cancelling on it keeps the revision
+                        await _notify(event_listener, RevisedEvent(iteration=i + 1,
+                                                                   suggestions=iteration_result.suggestions,
+                                                                   revised_output=iteration_result.revised_output))
+
+                    if not iteration_result.should_stop and self.speculation.evaluation and self.evaluator \
+                            and i + 1 < self.max_iterations:
+                        # Score the new revision while the rest of this iteration is being recorded
+                        pending_evaluation = asyncio.create_task(_timed(partial(
+                            self._evaluate,
+                            system_prompt=revision_input.system_prompt,
+                            user_input=revision_input.user_input,
+                            current_output=state.current_output,
+                            previous_output=state.previous_output,
+                            previous_evaluation=state.evaluation_history[-1] if state.evaluation_history else None,
+                            iteration=i + 2
+                        )))
+
+                    if self.journal and run_id:
+                        self.journal.record_iteration(run_id, i + 1, iteration_result.model_dump())
+                    if output_sink:
+                        output_sink.write_iteration(iteration_result.log_entry)
+
+                    if iteration_result.evaluation:
+                        logger.info(f"Iteration {i + 1} - Evaluation Results:")
+                        logger.info(f"Overall Score: {iteration_result.evaluation.overall_score}")
+                        logger.info(f"Aspect Scores: {iteration_result.evaluation.aspect_scores}")
+                        logger.info(f"Reasoning: {iteration_result.evaluation.combined_reasoning}")
+
+                    if iteration_result.should_stop:
+                        logger.info(iteration_result.stop_reason)
+                        break
+
+                    logger.info(f"Completed revision iteration {i + 1}")
+                    logger.info(f"Revised Output: {state.current_output}...")
+
+                if pending_evaluation is not None:
+                    # A speculative evaluation of a revision the run will not continue from was wasted
+                    pending_evaluation.cancel()
+                    pending_evaluation = None
+                    state.speculation.append({"iteration": state.completed_iterations + 1, "wasted_calls": 1})
+
+                if not state.stop_reason and self.return_best \
+                        and len(state.evaluation_history) < len(state.revision_history):
+                    # The last revision of a run that used all its iterations has not been scored yet, and
+                    # return_best can only pick revisions that have
+                    await self._evaluate_final_revision(revision_input, state, tracker)
+
+            result = self._build_result(revision_input, state, tracker.usage())
+            if self.journal and run_id:
+                self.journal.finish(run_id, result.model_dump())
+            return result
+        finally:
+            if pending_evaluation is not None:
+                pending_evaluation.cancel()
+            if output_sink:
+                # Flush whatever was written even when the run fails part way through
+                output_sink.close(result.final_output if result else state.current_output)
+
+    async def _evaluate_final_revision(self,
+                                       revision_input: RevisionInput,
+                                       state: RevisionState,
+                                       tracker: BudgetTracker):
+        evaluation = await self._within_budget(tracker, self._evaluate(
+            system_prompt=revision_input.system_prompt,
+            user_input=revision_input.user_input,
+            current_output=state.current_output,
+            previous_output=state.previous_output,
+            previous_evaluation=state.evaluation_history[-1] if state.evaluation_history else None,
+            iteration=state.completed_iterations + 1
+        ))
+        if evaluation is not None:
+            state.evaluation_history.append(evaluation)
+            logger.info(f"Final revision - Overall Score: {evaluation.overall_score}")
+
+    def _build_result(self,
+                      revision_input: RevisionInput,
+                      state: RevisionState,
+                      budget_usage: Optional[BudgetUsage] = None) -> RevisionResult:
+        # A run cut short by its budget may end on a worse revision, so the best evaluated one is returned
+        return_best = self.return_best or state.stop_reason in BUDGET_STOP_REASONS
+        return RevisionResult(
+            final_output=self._select_final_output(state.revision_history, state.evaluation_history, return_best),
+            revision_history=state.revision_history,
+            evaluation_history=state.evaluation_history,
+            final_suggestions=state.suggestions,
+            history_log=state.history_log,
+            stop_reason=state.stop_reason or "Maximum iterations reached",
+            speculation=state.speculation,
+            job_id=revision_input.job_id,
+            budget_usage=budget_usage
+        )
+
+    def _select_final_output(self,
+                             revision_history: Sequence[str],
+                             evaluation_history: List[EvaluationResult],
+                             return_best: Optional[bool] = None) -> str:
+        # evaluation_history[i] scores revision_history[i]; the last revision may not have been evaluated
+        return_best = self.return_best if return_best is None else return_best
+        candidates = [index for index, evaluation in enumerate(evaluation_history) if is_comparable(evaluation)]
+        if not return_best or not candidates:
+            return revision_history[-1]
+        best_index = max(candidates, key=lambda index: (evaluation_history[index].overall_score, index))
+        return revision_history[best_index]
+
+    async def revise_beam(self, revision_input: RevisionInput, budget: Optional[RunBudget] = None) -> RevisionResult:
+        if not self.evaluator:
+            raise ValueError("Beam revision requires an evaluator to rank candidates")
+
+        tracker = BudgetTracker(budget or self.budget)
+        with tracker.activate():
+            return await self._revise_beam(revision_input, tracker)
+
+    async def _revise_beam(self, revision_input: RevisionInput, tracker: BudgetTracker) -> RevisionResult:
+        initial_output = revision_input.initial_output or "No initial output provided."
+        initial_evaluation = await self._within_budget(tracker, self._evaluate(
+            system_prompt=revision_input.system_prompt,
+            user_input=revision_input.user_input,
+            current_output=initial_output,
+            previous_output=None
+        ))
+        if initial_evaluation is None:
+            stop_reason = tracker.stop_reason() or DEADLINE_REACHED
+            logger.warning(f"{stop_reason} before the initial output was evaluated")
+            return RevisionResult(final_output=initial_output, revision_history=[initial_output], evaluation_history=[],
+                                  final_suggestions=[], history_log=[], stop_reason=stop_reason,
+                                  job_id=revision_input.job_id, budget_usage=tracker.usage())
+        beams = [BeamCandidate(output=initial_output, evaluation=initial_evaluation)]
+        revision_history = [initial_output]
+        evaluation_history = [initial_evaluation]
         history_log = []
+        stop_reason = "Maximum iterations reached"
 
         for i in range(self.max_iterations):
-            logger.info(f"Starting revision iteration {i + 1}")
+            reason = self.stopping_policy.after_evaluation(evaluation_history) or tracker.stop_reason()
+            if reason:
+                stop_reason = reason
+                logger.info(stop_reason)
+                break
 
-            iteration_result = await self._perform_iteration(
-                revision_input=revision_input,
-                current_output=current_output,
-                previous_output=revision_history[-2] if len(revision_history) > 1 else None,
-                iteration=i + 1
-            )
+            logger.info(f"Starting beam iteration {i + 1} with {len(beams)} beam(s)")
+            candidates = await self._within_budget(tracker, self._expand_beams(revision_input, beams, iteration=i + 1))
+            if candidates is None:
+                # The beams are already ranked, so the best one so far is kept
+                stop_reason = tracker.stop_reason() or DEADLINE_REACHED
+                logger.warning(f"{stop_reason} during beam iteration {i + 1}; returning the best beam so far")
+                break
+            ranked = sorted(beams + candidates, key=lambda c: (is_comparable(c.evaluation), c.evaluation.overall_score),
+                            reverse=True)
+
+            seen_outputs = set()
+            beams = []
+            for candidate in ranked:
+                if candidate.output not in seen_outputs:
+                    seen_outputs.add(candidate.output)
+                    beams.append(candidate)
+                if len(beams) >= self.beam.keep:
+                    break
 
-            history_log.append(iteration_result.log_entry)
-            if iteration_result.evaluation:
-                evaluation_history.append(iteration_result.evaluation)
-                logger.info(f"Iteration {i + 1} - Evaluation Results:")
-                logger.info(f"Overall Score: {iteration_result.evaluation.overall_score}")
-                logger.info(f"Aspect Scores: {iteration_result.evaluation.aspect_scores}")
-                logger.info(f"Reasoning: {iteration_result.evaluation.combined_reasoning}")
+            best = beams[0]
+            history_log.append({
+                "iteration": i + 1,
+                "evaluation": best.evaluation.dict(),
+                "feedback": best.feedback,
+                "suggestions": best.suggestions,
+                "revised_output": best.output,
+                "candidates": [
+                    {"score": c.evaluation.overall_score,
+                     "selected": any(c is b for b in beams),
+                     "iteration": c.iteration}
+                    for c in ranked
+                ]
+            })
+            logger.info(f"Beam iteration {i + 1} - best score {best.evaluation.overall_score} "
+                        f"from {len(candidates)} candidate(s)")
 
-            if iteration_result.should_stop:
-                logger.info(iteration_result.stop_reason)
+            # A new candidate that only makes the lower beams still gives the next iteration something to expand
+            if not any(beam.iteration == i + 1 for beam in beams):
+                stop_reason = "No candidate improved on the current beams"
+                logger.info(stop_reason)
                 break
 
-            current_output = iteration_result.revised_output
-            revision_history.append(current_output)
-            logger.info(f"Completed revision iteration {i + 1}")
-            logger.info(f"Revised Output: {current_output}...")
+            if best.iteration == i + 1:
+                revision_history.append(best.output)
+                evaluation_history.append(best.evaluation)
 
         return RevisionResult(
-            final_output=current_output,
+            final_output=beams[0].output,
             revision_history=revision_history,
             evaluation_history=evaluation_history,
-            final_suggestions=iteration_result.suggestions,
-            history_log=history_log
+            final_suggestions=beams[0].suggestions,
+            history_log=history_log,
+            stop_reason=stop_reason,
+            job_id=revision_input.job_id,
+            budget_usage=tracker.usage()
+        )
+
+    def _plan_beam_expansion(self, beam_count: int) -> Tuple[int, int]:
+        feedback_calls = (lambda k: 2 * k) if self.beam.sample_feedback else (lambda k: k + 1)
+        for beams_to_expand in range(beam_count, 0, -1):
+            for candidates in range(self.beam.candidates, 0, -1):
+                if beams_to_expand * feedback_calls(candidates) <= self.beam.max_calls_per_iteration:
+                    return beams_to_expand, candidates
+        return 1, 1
+
+    async def _expand_beams(self,
+                            revision_input: RevisionInput,
+                            beams: List[BeamCandidate],
+                            iteration: int) -> List[BeamCandidate]:
+        beams_to_expand, candidates_per_beam = self._plan_beam_expansion(len(beams))
+        expansions = await asyncio.gather(*(
+            self._expand_beam(revision_input, beam, candidates_per_beam, iteration)
+            for beam in beams[:beams_to_expand]
+        ))
+        candidates = [candidate for expansion in expansions for candidate in expansion]
+
+        evaluations = await asyncio.gather(*(
+            self._evaluate(
+                system_prompt=revision_input.system_prompt,
+                user_input=revision_input.user_input,
+                current_output=candidate.output,
+                previous_output=candidate.previous_output
+            )
+            for candidate in candidates
+        ))
+        for candidate, evaluation in zip(candidates, evaluations):
+            candidate.evaluation = evaluation
+        return candidates
+
+    async def _expand_beam(self,
+                           revision_input: RevisionInput,
+                           beam: BeamCandidate,
+                           candidates: int,
+                           iteration: int) -> List[BeamCandidate]:
+        async def generate(variant: int, feedback: Optional[str] = None) -> BeamCandidate:
+            if feedback is None:
+                feedback = await self._get_feedback(
+                    system_prompt=revision_input.system_prompt,
+                    user_input=revision_input.user_input,
+                    current_output=beam.output,
+                    previous_output=beam.previous_output,
+                    evaluation=beam.evaluation,
+                    variant=variant
+                )
+            suggestions, revised_output = await self._get_revision(
+                system_prompt=revision_input.system_prompt,
+                user_input=revision_input.user_input,
+                current_output=beam.output,
+                previous_output=beam.previous_output,
+                evaluation=beam.evaluation,
+                feedback=feedback,
+                variant=variant
+            )
+            return BeamCandidate(
+                output=revised_output,
+                previous_output=beam.output,
+                feedback=feedback,
+                suggestions=suggestions,
+                iteration=iteration
+            )
+
+        if self.beam.sample_feedback:
+            return list(await asyncio.gather(*(generate(variant) for variant in range(candidates))))
+
+        feedback = await self._get_feedback(
+            system_prompt=revision_input.system_prompt,
+            user_input=revision_input.user_input,
+            current_output=beam.output,
+            previous_output=beam.previous_output,
+            evaluation=beam.evaluation
         )
+        return list(await asyncio.gather(*(generate(variant, feedback) for variant in range(candidates))))
+
+    async def revise_many(self,
+                          revision_inputs: Union[Iterable[RevisionInput], AsyncIterable[RevisionInput]],
+                          max_concurrency: int = config['batch']['max_concurrency'],
+                          sink_factory: Optional[Callable[[RevisionInput], OutputSink]] = None
+                          ) -> AsyncIterator[RevisionResult]:
+        pending = set()
+        inputs = _iterate(revision_inputs)
+        next_input: Optional[asyncio.Task] = None
+        exhausted = False
+        try:
+            while pending or not exhausted:
+                if not exhausted and next_input is None and len(pending) < max_concurrency:
+                    next_input = asyncio.create_task(_next_item(inputs))
+                # Fetching the next input races the running jobs, so a slow input source never holds back results
+                waiting = pending | {next_input} if next_input else pending
+                done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                if next_input in done:
+                    revision_input = next_input.result()
+                    next_input = None
+                    if revision_input is _EXHAUSTED:
+                        exhausted = True
+                    else:
+                        pending.add(asyncio.create_task(self._revise_job(revision_input, sink_factory)))
+                for task in done & pending:
+                    pending.discard(task)
+                    yield task.result()
+        finally:
+            if next_input is not None:
+                next_input.cancel()
+            for task in pending:
+                task.cancel()
+
+    async def _revise_job(self,
+                          revision_input: RevisionInput,
+                          sink_factory: Optional[Callable[[RevisionInput], OutputSink]] = None) -> RevisionResult:
+        try:
+            journal_state = self.journal.load(revision_input.job_id) \
+                if self.journal and revision_input.job_id else None
+            if journal_state is not None:
+                # Job ids default to line numbers, so a journal entry may belong to another jobs file
+                if journal_state['input'] != revision_input.model_dump():
+                    logger.warning(f"Journal for revision job {revision_input.job_id} was recorded for a different "
+                                   f"input; starting the job afresh")
+                elif self.journal.is_finished(revision_input.job_id):
+                    logger.info(f"Revision job {revision_input.job_id} already finished; skipping")
+                    return RevisionResult(**self.journal.load_result(revision_input.job_id))
+                else:
+                    return await self.resume(revision_input.job_id,
+                                             output_sink=sink_factory(revision_input) if sink_factory else None)
+            return await self.revise(revision_input,
+                                     output_sink=sink_factory(revision_input) if sink_factory else None)
+        except Exception as e:
+            logger.error(f"Revision job {revision_input.job_id} failed: {str(e)}")
+            initial_output = revision_input.initial_output or "No initial output provided."
+            return RevisionResult(
+                final_output=initial_output,
+                revision_history=[initial_output],
+                evaluation_history=[],
+                final_suggestions=[],
+                history_log=[],
+                job_id=revision_input.job_id,
+                error=str(e)
+            )
 
     async def _perform_iteration(self,
                                  revision_input: RevisionInput,
                                  current_output: str,
                                  previous_output: Optional[str],
-                                 iteration: int) -> IterationResult:
+                                 iteration: int,
+                                 evaluation_history: List[EvaluationResult],
+                                 pending_evaluation: Optional[asyncio.Task] = None,
+                                 event_listener: Optional[Callable[[RevisionEvent], Any]] = None) -> IterationResult:
+        iteration_start = time.perf_counter()
+        speculation = {}
+        compactions: List[Dict[str, Any]] = []
 
-        evaluation = await self._evaluate(
+        stale_evaluation = evaluation_history[-1] if self.speculation.feedback and evaluation_history else None
+        feedback_task = asyncio.create_task(_timed(partial(
+            self._get_feedback,
             system_prompt=revision_input.system_prompt,
             user_input=revision_input.user_input,
             current_output=current_output,
-            previous_output=previous_output
-        ) if self.evaluator else None
+            previous_output=previous_output,
+            evaluation=stale_evaluation,
+            compactions=compactions
+        ))) if stale_evaluation else None
+
+        try:
+            if pending_evaluation is not None:
+                wait_start = time.perf_counter()
+                evaluation, evaluation_seconds = await pending_evaluation
+                speculation["evaluation_seconds_saved"] = max(
+                    0.0, evaluation_seconds - (time.perf_counter() - wait_start)
+                )
+            else:
+                evaluation, evaluation_seconds = await _timed(partial(
+                    self._evaluate,
+                    system_prompt=revision_input.system_prompt,
+                    user_input=revision_input.user_input,
+                    current_output=current_output,
+                    previous_output=previous_output,
+                    previous_evaluation=evaluation_history[-1] if evaluation_history else None,
+                    iteration=iteration
+                )) if self.evaluator else (None, 0.0)
+        except BaseException:
+            if feedback_task:
+                feedback_task.cancel()
+            raise
+        if evaluation:
+            await _notify(event_listener, EvaluationEvent(iteration=iteration, evaluation=evaluation))
+
+        stop_reason = self.stopping_policy.after_evaluation(evaluation_history + [evaluation]) \
+            if evaluation else None
 
-        if evaluation and evaluation.overall_score >= config['reviser']['target_score']:
+        feedback = None
+        if feedback_task:
+            if not stop_reason and abs(evaluation.overall_score - stale_evaluation.overall_score) <= \
+                    self.speculation.max_score_drift:
+                feedback, feedback_seconds = await feedback_task
+                speculation["feedback_seconds_saved"] = max(
+                    0.0, evaluation_seconds + feedback_seconds - (time.perf_counter() - iteration_start)
+                )
+            else:
+                feedback_task.cancel()
+                speculation["wasted_calls"] = 1
+
+        if stop_reason:
             return IterationResult(
                 should_stop=True,
-                stop_reason="Target score reached",
-                evaluation=evaluation
+                stop_reason=stop_reason,
+                evaluation=evaluation,
+                speculation=speculation
             )
 
-        feedback = await self._get_feedback(
-            system_prompt=revision_input.system_prompt,
-            user_input=revision_input.user_input,
-            current_output=current_output,
-            previous_output=previous_output,
-            evaluation=evaluation
-        )
-        revision_result = await self._get_revision(
+        if feedback is None:
+            feedback = await self._get_feedback(
+                system_prompt=revision_input.system_prompt,
+                user_input=revision_input.user_input,
+                current_output=current_output,
+                previous_output=previous_output,
+                evaluation=evaluation,
+                compactions=compactions
+            )
+        await _notify(event_listener, FeedbackEvent(iteration=iteration, feedback=feedback))
+        suggestions, revised_output = await self._get_revision(
             system_prompt=revision_input.system_prompt,
             user_input=revision_input.user_input,
             current_output=current_output,
             previous_output=previous_output,
             evaluation=evaluation,
-            feedback=feedback
+            feedback=feedback,
+            compactions=compactions
         )
 
-        suggestions, revised_output = await self.parse_revision_result(revision_result)
-
         log_entry = {
             "iteration": iteration,
             "evaluation": evaluation.dict() if evaluation else None,
@@ -140,44 +795,90 @@ class Reviser:
             "suggestions": suggestions,
             "revised_output": revised_output
         }
+        if speculation:
+            log_entry["speculation"] = speculation
+        if compactions:
+            log_entry["compaction"] = compactions
 
-        if revised_output == current_output:
+        stop_reason = self.stopping_policy.after_revision(current_output, revised_output)
+        if stop_reason:
             return IterationResult(
                 should_stop=True,
-                stop_reason="Output converged",
+                stop_reason=stop_reason,
                 log_entry=log_entry,
                 suggestions=suggestions,
                 revised_output=revised_output,
-                evaluation=evaluation
+                evaluation=evaluation,
+                speculation=speculation
             )
 
         return IterationResult(
             log_entry=log_entry,
             suggestions=suggestions,
             revised_output=revised_output,
-            evaluation=evaluation
+            evaluation=evaluation,
+            speculation=speculation
         )
 
     async def _evaluate(self,
                         system_prompt: str,
                         user_input: str,
                         current_output: str,
-                        previous_output: Optional[str]) -> Optional[EvaluationResult]:
+                        previous_output: Optional[str],
+                        previous_evaluation: Optional[EvaluationResult] = None,
+                        iteration: Optional[int] = None) -> Optional[EvaluationResult]:
         if not self.evaluator:
             return None
-        result = await self.evaluator.evaluate(system_prompt, user_input, current_output, previous_output)
+
+        carried = self._carried_aspects(current_output, previous_output, previous_evaluation, iteration)
+        if carried:
+            aspects = self.evaluator.evaluation_aspects
+            fresh_aspects = [aspect for aspect in aspects if aspect not in carried]
+            fresh = await self.evaluator.evaluate_aspects(fresh_aspects, system_prompt, user_input, current_output,
+                                                          previous_output) if fresh_aspects else \
+                AggregatedEvaluationResult(overall_score=0, aspect_scores={}, combined_reasoning="")
+            logger.info(f"Carrying forward scores for {', '.join(carried)}; re-scoring {', '.join(fresh_aspects)}")
+            result = merge_carried_aspects(fresh, previous_evaluation, carried, aspects)
+        else:
+            result = await self.evaluator.evaluate(system_prompt, user_input, current_output, previous_output)
         return EvaluationResult(
             overall_score=result.overall_score,
             aspect_scores=result.aspect_scores,
-            combined_reasoning=result.combined_reasoning
+            combined_reasoning=result.combined_reasoning,
+            failed_aspects=getattr(result, 'failed_aspects', []),
+            aspect_reasoning=getattr(result, 'aspect_reasoning', {}),
+            aspect_sources=getattr(result, 'aspect_sources', {})
         )
 
+    def _carried_aspects(self,
+                         current_output: str,
+                         previous_output: Optional[str],
+                         previous_evaluation: Optional[EvaluationResult],
+                         iteration: Optional[int]) -> List[str]:
+        settings = self.incremental_evaluation
+        if not settings.enabled or previous_evaluation is None or previous_output is None or iteration is None \
+                or not hasattr(self.evaluator, 'evaluate_aspects'):
+            return []
+        # Periodic and final evaluations are always scored from scratch so carried scores cannot drift for long
+        if iteration >= self.max_iterations or (settings.full_rescore_every and
+                                                iteration % settings.full_rescore_every == 0):
+            return []
+        if not _small_edit(previous_output, current_output, settings.max_edit_ratio):
+            return []
+        return [
+            aspect for aspect, score in previous_evaluation.aspect_scores.items()
+            if score >= settings.min_carry_score and aspect in previous_evaluation.aspect_reasoning
+            and aspect not in previous_evaluation.failed_aspects
+        ]
+
     async def _get_feedback(self,
                             system_prompt: str,
                             user_input: str,
                             current_output: str,
                             previous_output: Optional[str],
-                            evaluation: Optional[EvaluationResult]) -> str:
+                            evaluation: Optional[EvaluationResult],
+                            variant: int = 0,
+                            compactions: Optional[List[Dict[str, Any]]] = None) -> str:
         feedback_input = {
             "system_prompt": system_prompt,
             "user_input": user_input,
@@ -190,7 +891,11 @@ class Reviser:
                 "evaluation_aspect_scores": evaluation.aspect_scores,
                 "evaluation_combined_reasoning": evaluation.combined_reasoning
             })
-        return await self.feedback_chain.ainvoke(feedback_input)
+        feedback_input = self._apply_context_budget("feedback", FEEDBACK_PROMPT, feedback_input, compactions)
+        return await self._invoke_chain(
+            "feedback", self.feedback_chain, FEEDBACK_PROMPT, self.reviser_llm, self.reviser_provider, feedback_input,
+            variant, alternate=self.alternate_reviser
+        )
 
     async def _get_revision(self,
                             system_prompt: str,
@@ -198,7 +903,9 @@ class Reviser:
                             current_output: str,
                             previous_output: Optional[str],
                             evaluation: Optional[EvaluationResult],
-                            feedback: str) -> str:
+                            feedback: str,
+                            variant: int = 0,
+                            compactions: Optional[List[Dict[str, Any]]] = None) -> Tuple[List[str], str]:
         revision_input = {
             "system_prompt": system_prompt,
             "user_input": user_input,
@@ -212,26 +919,313 @@ class Reviser:
                 "evaluation_aspect_scores": evaluation.aspect_scores,
                 "evaluation_combined_reasoning": evaluation.combined_reasoning
             })
-        return await self.revision_chain.ainvoke(revision_input)
+        # The document being revised has to be sent whole, so only the surrounding context is compacted
+        revision_input = self._apply_context_budget("revise", REVISION_PROMPT, revision_input, compactions,
+                                                    protected=("current_output",))
+        if self.revision_mode == 'patch':
+            patched = await self._get_patch_revision(current_output, revision_input, variant)
+            if patched is not None:
+                return patched
+        if self.structured_output:
+            return await self._get_structured_revision(current_output, revision_input, variant)
+
+        revision_result = await self._invoke_chain(
+            "revise", self.revision_chain, REVISION_PROMPT, self.agent_llm, self.agent_provider, revision_input,
+            variant, stream=self.stream_revisions, alternate=self.alternate_agent, cacheable=_has_revised_output
+        )
+        return await self.parse_revision_result(revision_result)
+
+    def _apply_context_budget(self,
+                              stage: str,
+                              prompt: ChatPromptTemplate,
+                              chain_input: Dict[str, Any],
+                              compactions: Optional[List[Dict[str, Any]]] = None,
+                              protected: Tuple[str, ...] = ()) -> Dict[str, Any]:
+        if not self.context_budget:
+            return chain_input
+        fields = [field for field in BUDGETED_FIELDS if field in prompt.input_variables]
+        compacted, records = self.context_budget.compact(chain_input, fields, protected)
+        if records:
+            logger.info(f"Compacted {stage} context: " + ", ".join(
+                f"{record['field']} {record['action']} {record['tokens_before']}->{record['tokens_after']} tokens"
+                for record in records
+            ))
+            if compactions is not None:
+                compactions.extend({"stage": stage, **record} for record in records)
+        return compacted
+
+    async def _get_patch_revision(self,
+                                  current_output: str,
+                                  revision_input: Dict[str, Any],
+                                  variant: int = 0) -> Optional[Tuple[List[str], str]]:
+        patch_result = await self._invoke_chain(
+            "revise", self.patch_chain, PATCH_REVISION_PROMPT, self.agent_llm, self.agent_provider, revision_input,
+            variant, alternate=self.alternate_agent, cacheable=_is_patch
+        )
+        try:
+            suggestions, edits = parse_patch_result(patch_result)
+            return suggestions, apply_edits(current_output, edits, self.patch_match_threshold)
+        except PatchError as e:
+            logger.warning(f"Patch revision could not be applied, falling back to full rewrite: {str(e)}")
+            return None
+
+    async def _get_structured_revision(self,
+                                       current_output: str,
+                                       revision_input: Dict[str, Any],
+                                       variant: int = 0) -> Tuple[List[str], str]:
+        # Structured revisions are not streamed: the listener expects the SUGGESTIONS/REVISED OUTPUT text format
+        revision_result = await self._invoke_chain(
+            "revise", self.structured_revision_chain, STRUCTURED_REVISION_PROMPT, self.agent_llm, self.agent_provider,
+            revision_input, variant, alternate=self.alternate_agent,
+            cacheable=lambda text: parse_structured(text, RevisionOutput).result is not None
+        )
+        conversation = STRUCTURED_REVISION_PROMPT.format_messages(**revision_input)
+
+        async def reask(previous: str, fields: List[str], error: str) -> str:
+            conversation.append(AIMessage(content=previous))
+            reask_input = {"conversation": list(conversation), "fields": ", ".join(fields), "error": error}
+            conversation.append(HumanMessage(content=REASK_PROMPT.format(fields=reask_input["fields"], error=error)))
+            return await self._invoke_chain(
+                "reask", self.reask_chain, REASK_CHAT_PROMPT, self.agent_llm, self.agent_provider, reask_input,
+                variant, alternate=self.alternate_agent
+            )
+
+        outcome = await parse_with_reasks(revision_result, RevisionOutput, reask, self.max_reasks, "revision",
+                                          _model_name(self.agent_llm))
+        if outcome.result is not None:
+            return outcome.result.suggestions, outcome.result.revised_output
+        suggestions = outcome.valid.get('suggestions') or []
+        if outcome.valid.get('revised_output'):
+            return suggestions, outcome.valid['revised_output']
+        # Models that ignore the JSON instructions usually still answer in the text format; re-asks only carry the
+        # malformed fields, so the full answer is in the first response
+        parser = RevisionStreamParser()
+        parser.feed(revision_result)
+        parser.close()
+        if parser.revised_output:
+            return suggestions or parser.suggestions, parser.revised_output
+        logger.warning("No usable revised output after re-asks; keeping the current output")
+        return suggestions, current_output
+
+    async def _invoke_chain(self,
+                            stage: str,
+                            chain: Runnable,
+                            prompt: ChatPromptTemplate,
+                            llm: BaseChatModel,
+                            provider: str,
+                            chain_input: Dict[str, Any],
+                            variant: int = 0,
+                            stream: bool = False,
+                            alternate: Optional[AlternateModel] = None,
+                            cacheable: Optional[Callable[[str], bool]] = None) -> str:
+        rendered_prompt = prompt.format(**chain_input)
+        # Beam candidates sampled from the same prompt must not collapse onto one cache entry
+        cache_key = make_cache_key("chain", llm._get_llm_string(), rendered_prompt, variant) \
+            if self.cache else None
+        model = _model_name(llm)
+        with instrumentation.span(stage, model) as span:
+            if cache_key:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    span.cache_hit = True
+                    return cached
+
+            run_config = {"callbacks": [TokenUsageCallback(span)]}
+            tokens = estimate_tokens(rendered_prompt)
+
+            def attempt(attempt_chain: Runnable, attempt_provider: str, attempt_model: str):
+                async def call() -> str:
+                    if stream:
+                        return await self._stream_revision(attempt_chain, chain_input, run_config)
+                    return await attempt_chain.ainvoke(chain_input, config=run_config)
+
+                async def limited() -> str:
+                    async with self.limiter.slot(attempt_provider):
+                        if self.rate_limiter:
+                            return await self.rate_limiter.call(attempt_provider, attempt_model, call, tokens, span)
+                        return await call()
+
+                return limited
+
+            # Streamed revisions feed the revision listener, which cannot take two interleaved streams
+            if self.hedger and not stream:
+                backup = None
+                if alternate:
+                    backup = attempt(prompt | alternate.llm | StrOutputParser(), alternate.provider,
+                                     _model_name(alternate.llm))
+                result = await self.hedger.call(stage, model, attempt(chain, provider, model), backup, tokens,
+                                                retry_on_failure=self.rate_limiter is None)
+            else:
+                result = await attempt(chain, provider, model)()
+
+        # Malformed responses are not cached, otherwise a retry with the same input would replay them
+        if cache_key and (cacheable is None or cacheable(result)):
+            self.cache.set(cache_key, result)
+        return result
+
+    async def _stream_revision(self, chain: Runnable, chain_input: Dict[str, Any], run_config: Dict[str, Any]) -> str:
+        parser = RevisionStreamParser()
+        stream = chain.astream(chain_input, config=run_config)
+        try:
+            async for chunk in stream:
+                await self._notify_revision_listener(parser.feed(chunk))
+                if parser.done:
+                    # Stop paying for tokens once the revised output is terminated
+                    break
+        finally:
+            await stream.aclose()
+
+        await self._notify_revision_listener(parser.close())
+        return parser.raw_text
+
+    async def _notify_revision_listener(self, events: List[RevisionStreamEvent]):
+        for event in events:
+            await _notify(self.revision_listener, event)
 
     @staticmethod
     async def parse_revision_result(revision_result: str) -> Tuple[List[str], str]:
-        suggestions = []
-        revised_output = ""
-        current_section = None
-
-        for line in revision_result.split('\n'):
-            line = line.strip()
-            if line.startswith('REVISED OUTPUT:'):
-                current_section = 'revised_output'
-                continue
-            elif line.startswith('SUGGESTIONS:'):
-                current_section = 'suggestions'
-                continue
-
-            if current_section == 'suggestions':
-                suggestions.append(line)
-            elif current_section == 'revised_output':
-                revised_output += line + '\n'
-
-        return suggestions, revised_output.strip()
+        with instrumentation.span("parse") as span:
+            parser = RevisionStreamParser()
+            parser.feed(revision_result)
+            parser.close()
+            if not parser.revised_output:
+                span.parse_failures += 1
+                logger.warning("Revision response has no revised output")
+        return parser.suggestions, parser.revised_output
+
+
+class RevisionStream:
+    def __init__(self,
+                 reviser: Reviser,
+                 revision_input: RevisionInput,
+                 run_id: Optional[str] = None,
+                 output_sink: Optional[OutputSink] = None,
+                 budget: Optional[RunBudget] = None):
+        self.reviser = reviser
+        self.revision_input = revision_input
+        self.run_id = run_id
+        self.result: Optional[RevisionResult] = None
+        self._events: asyncio.Queue = asyncio.Queue()
+        self._finished = False
+        self._tracker = BudgetTracker(budget or reviser.budget)
+        self._state = reviser._start_run(revision_input, run_id)
+        with reviser._hedge_budget():
+            self._task = asyncio.create_task(self._drive(output_sink))
+
+    async def _drive(self, output_sink: Optional[OutputSink]):
+        try:
+            self.result = await self.reviser._run(self.revision_input, self._state, self.run_id, output_sink,
+                                                  event_listener=self._events.put_nowait, tracker=self._tracker)
+        except asyncio.CancelledError:
+            self.result = self._partial_result()
+        except Exception:
+            self._events.put_nowait(None)
+            raise
+        self._stopped()
+
+    def _partial_result(self) -> RevisionResult:
+        # Only completed iterations are in the state, so the partial result never includes a half-finished one
+        self._state.stop_reason = self._state.stop_reason or "Cancelled"
+        return self.reviser._build_result(self.revision_input, self._state, self._tracker.usage())
+
+    def _stopped(self):
+        self._events.put_nowait(StoppedEvent(iteration=self._state.completed_iterations,
+                                             stop_reason=self.result.stop_reason, result=self.result))
+        self._events.put_nowait(None)
+
+    def __aiter__(self) -> "RevisionStream":
+        return self
+
+    async def __anext__(self) -> RevisionEvent:
+        if self._finished:
+            raise StopAsyncIteration
+        event = await self._events.get()
+        if event is None:
+            self._finished = True
+            await asyncio.wait({self._task})
+            if not self._task.cancelled():
+                # Surfaces the error of a run that failed
+                self._task.result()
+            raise StopAsyncIteration
+        return event
+
+    async def cancel(self) -> RevisionResult:
+        if not self._task.done():
+            self._task.cancel()
+            await asyncio.wait({self._task})
+        if self._task.cancelled() and self.result is None:
+            # Cancelled before the run got to start
+            self.result = self._partial_result()
+            self._stopped()
+        elif not self._task.cancelled() and self._task.exception() is not None:
+            raise self._task.exception()
+        return self.result
+
+    async def __aenter__(self) -> "RevisionStream":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.cancel()
+
+
+def _small_edit(before: str, after: str, max_edit_ratio: float) -> bool:
+    if before == after:
+        return True
+    matcher = SequenceMatcher(None, before, after, autojunk=False)
+    min_similarity = 1.0 - max_edit_ratio
+    if matcher.real_quick_ratio() < min_similarity or matcher.quick_ratio() < min_similarity:
+        return False
+    return matcher.ratio() >= min_similarity
+
+
+def _has_revised_output(revision_result: str) -> bool:
+    parser = RevisionStreamParser()
+    parser.feed(revision_result)
+    parser.close()
+    return bool(parser.revised_output)
+
+
+def _is_patch(patch_result: str) -> bool:
+    try:
+        parse_patch_result(patch_result)
+    except PatchError:
+        return False
+    return True
+
+
+def _model_name(llm: BaseChatModel) -> str:
+    return getattr(llm, 'model_name', None) or getattr(llm, 'model', None) or type(llm).__name__
+
+
+async def _notify(listener: Optional[Callable[[Any], Any]], event: Any):
+    if not listener:
+        return
+    result = listener(event)
+    if inspect.isawaitable(result):
+        await result
+
+
+async def _timed(factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, float]:
+    # Takes a factory so a task cancelled before it starts leaves no un-awaited coroutine behind
+    start = time.perf_counter()
+    result = await factory()
+    return result, time.perf_counter() - start
+
+
+_EXHAUSTED = object()
+
+
+async def _next_item(items: AsyncIterator[Any]) -> Any:
+    try:
+        return await items.__anext__()
+    except StopAsyncIteration:
+        return _EXHAUSTED
+
+
+async def _iterate(items: Union[Iterable[Any], AsyncIterable[Any]]) -> AsyncIterator[Any]:
+    if hasattr(items, '__aiter__'):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
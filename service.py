@@ -0,0 +1,311 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+from pydantic import ValidationError
+
+from budget import RunBudget
+from config import config
+from instrumentation import instrumentation
+from output_handler import OutputSink
+from reviser import Reviser, RevisionInput, RevisionResult
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class ServiceJob:
+    def __init__(self, job_id: str, revision_input: RevisionInput, priority: int, budget: Optional[RunBudget] = None):
+        self.job_id = job_id
+        self.revision_input = revision_input
+        self.priority = priority
+        self.budget = budget
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.iterations_completed = 0
+        self.result: Optional[RevisionResult] = None
+        self.error: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    async def publish(self, event: Dict[str, Any]):
+        async with self._changed:
+            self.events.append({"job_id": self.job_id, "time": time.time(), **event})
+            self._changed.notify_all()
+
+    async def wait_for_events(self, seen: int):
+        async with self._changed:
+            await self._changed.wait_for(lambda: len(self.events) > seen or self.finished)
+
+    def status_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "priority": self.priority,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "iterations_completed": self.iterations_completed,
+            "error": self.error
+        }
+
+
+class ProgressSink(OutputSink):
+    def __init__(self, job: ServiceJob):
+        self.job = job
+        self._pending: List[asyncio.Task] = []
+
+    def write_iteration(self, entry: Dict[str, Any]):
+        self.job.iterations_completed += 1
+        evaluation = entry.get('evaluation') or {}
+        self._pending.append(asyncio.ensure_future(self.job.publish({
+            "type": "iteration",
+            "iteration": entry.get('iteration', self.job.iterations_completed),
+            "overall_score": evaluation.get('overall_score'),
+            "aspect_scores": evaluation.get('aspect_scores'),
+            "suggestions": entry.get('suggestions', []),
+            "revised_output": entry.get('revised_output')
+        })))
+
+    def close(self, final_output: str):
+        pass
+
+    async def flush(self):
+        if self._pending:
+            await asyncio.gather(*self._pending)
+            self._pending = []
+
+
+class RevisionService:
+    def __init__(self,
+                 reviser: Reviser,
+                 workers: int = config['service']['workers'],
+                 queue_size: int = config['service']['queue_size'],
+                 max_finished_jobs: int = config['service']['max_finished_jobs']):
+        self.reviser = reviser
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs: "OrderedDict[str, ServiceJob]" = OrderedDict()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._worker_tasks: List[asyncio.Task] = []
+        self.running = 0
+
+    async def start(self):
+        self._queue = asyncio.PriorityQueue(maxsize=self.queue_size)
+        self._worker_tasks = [asyncio.create_task(self._worker(index)) for index in range(self.workers)]
+        logger.info(f"Revision service started with {self.workers} worker(s), queue size {self.queue_size}")
+
+    async def stop(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+        running = [job.task for job in self.jobs.values() if job.task is not None and not job.task.done()]
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        for job in self.jobs.values():
+            if not job.finished:
+                await self._finish(job, CANCELLED, error="Service stopped")
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def submit(self,
+                     revision_input: RevisionInput,
+                     priority: int = 0,
+                     budget: Optional[RunBudget] = None) -> ServiceJob:
+        job_id = revision_input.job_id or uuid.uuid4().hex
+        if job_id in self.jobs and not self.jobs[job_id].finished:
+            raise ValueError(f"Job {job_id} is already queued or running")
+        revision_input = revision_input.model_copy(update={"job_id": job_id})
+
+        job = ServiceJob(job_id, revision_input, priority, budget)
+        try:
+            # Higher priorities are served first; the sequence keeps equal priorities in arrival order
+            self._queue.put_nowait((-priority, next(self._sequence), job))
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Job queue is full ({self.queue_size} jobs waiting)")
+
+        self.jobs[job_id] = job
+        self.jobs.move_to_end(job_id)
+        await job.publish({"type": "queued", "priority": priority})
+        self._evict_finished_jobs()
+        return job
+
+    async def cancel(self, job_id: str) -> ServiceJob:
+        job = self.jobs[job_id]
+        if job.finished:
+            return job
+        if job.task is not None:
+            job.task.cancel()
+            await asyncio.wait({job.task})
+        else:
+            await self._finish(job, CANCELLED)
+        return job
+
+    async def _worker(self, index: int):
+        while True:
+            _, _, job = await self._queue.get()
+            try:
+                if job.finished:
+                    continue
+                job.task = asyncio.create_task(self._run_job(job))
+                # Waiting without awaiting the task directly keeps a job cancellation from stopping the worker
+                await asyncio.wait({job.task})
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job: ServiceJob):
+        job.status = RUNNING
+        job.started_at = time.time()
+        self.running += 1
+        await job.publish({"type": "started"})
+        sink = ProgressSink(job)
+        try:
+            result = await self.reviser.revise(job.revision_input, output_sink=sink, budget=job.budget)
+            await sink.flush()
+            job.result = result
+            await self._finish(job, COMPLETED, stop_reason=result.stop_reason)
+        except asyncio.CancelledError:
+            await sink.flush()
+            await self._finish(job, CANCELLED)
+        except Exception as e:
+            logger.error(f"Revision job {job.job_id} failed: {str(e)}")
+            await sink.flush()
+            await self._finish(job, FAILED, error=str(e))
+        finally:
+            self.running -= 1
+
+    async def _finish(self, job: ServiceJob, status: str, error: Optional[str] = None, **details: Any):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        await job.publish({"type": status, "error": error, **details})
+
+    def _evict_finished_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
+
+
+def create_app(service: RevisionService) -> web.Application:
+    routes = web.RouteTableDef()
+
+    def get_job(request: web.Request) -> ServiceJob:
+        job = service.jobs.get(request.match_info['job_id'])
+        if job is None:
+            raise web.HTTPNotFound(text=json.dumps({"error": "Unknown job"}), content_type="application/json")
+        return job
+
+    @routes.post("/jobs")
+    async def submit_job(request: web.Request) -> web.Response:
+        try:
+            body = await request.json()
+            priority = int(body.pop('priority', 0))
+            # Clients holding a latency SLO pass an absolute deadline so time spent queued counts against it
+            budget = RunBudget(**body.pop('budget')) if body.get('budget') else None
+            revision_input = RevisionInput(**body)
+        except (ValueError, TypeError, ValidationError) as e:
+            return web.json_response({"error": f"Invalid job: {str(e)}"}, status=400)
+
+        try:
+            job = await service.submit(revision_input, priority, budget)
+        except QueueFullError as e:
+            return web.json_response({"error": str(e)}, status=429, headers={"Retry-After": "1"})
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=409)
+        return web.json_response(job.status_dict(), status=202)
+
+    @routes.get("/jobs/{job_id}")
+    async def job_status(request: web.Request) -> web.Response:
+        return web.json_response(get_job(request).status_dict())
+
+    @routes.get("/jobs/{job_id}/result")
+    async def job_result(request: web.Request) -> web.Response:
+        job = get_job(request)
+        if not job.finished:
+            return web.json_response(job.status_dict(), status=409)
+        if job.result is None:
+            return web.json_response(job.status_dict(), status=410 if job.status == CANCELLED else 500)
+        return web.Response(text=job.result.model_dump_json(), content_type="application/json")
+
+    @routes.get("/jobs/{job_id}/events")
+    async def job_events(request: web.Request) -> web.StreamResponse:
+        job = get_job(request)
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+
+        seen = 0
+        while True:
+            events = job.events[seen:]
+            for event in events:
+                await response.write((json.dumps(event, default=str) + "\n").encode())
+            seen += len(events)
+            if job.finished and seen == len(job.events):
+                break
+            await job.wait_for_events(seen)
+
+        await response.write_eof()
+        return response
+
+    @routes.delete("/jobs/{job_id}")
+    async def cancel_job(request: web.Request) -> web.Response:
+        job = await service.cancel(get_job(request).job_id)
+        return web.json_response(job.status_dict())
+
+    @routes.get("/health")
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({
+            "workers": service.workers,
+            "queued": service.queued,
+            "running": service.running,
+            "jobs": len(service.jobs)
+        })
+
+    @routes.get("/metrics")
+    async def metrics(request: web.Request) -> web.Response:
+        text = instrumentation.to_prometheus()
+        if service.reviser.hedger:
+            text += service.reviser.hedger.to_prometheus()
+        return web.Response(text=text, content_type="text/plain")
+
+    app = web.Application()
+    app.add_routes(routes)
+
+    async def on_startup(app: web.Application):
+        await service.start()
+
+    async def on_cleanup(app: web.Application):
+        await service.stop()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
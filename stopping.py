@@ -0,0 +1,124 @@
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Sequence
+
+from config import config
+
+
+def is_comparable(evaluation: Any) -> bool:
+    # Failed aspects are left out of the overall score, and cascade screen scores come from a cheaper evaluator, so
+    # neither is comparable with a full evaluation's
+    if getattr(evaluation, 'failed_aspects', None):
+        return False
+    return "screen" not in getattr(evaluation, 'aspect_sources', {}).values()
+
+
+class StoppingPolicy:
+    def after_evaluation(self, evaluation_history: Sequence[Any]) -> Optional[str]:
+        return None
+
+    def after_revision(self, current_output: str, revised_output: str) -> Optional[str]:
+        return None
+
+
+class TargetScorePolicy(StoppingPolicy):
+    def __init__(self, target_score: float):
+        self.target_score = target_score
+
+    def after_evaluation(self, evaluation_history: Sequence[Any]) -> Optional[str]:
+        if not evaluation_history:
+            return None
+        evaluation = evaluation_history[-1]
+        if not is_comparable(evaluation):
+            return None
+        if evaluation.overall_score >= self.target_score:
+            return "Target score reached"
+        return None
+
+
+class PlateauPolicy(StoppingPolicy):
+    def __init__(self, window: int, min_improvement: float):
+        self.window = window
+        self.min_improvement = min_improvement
+
+    def after_evaluation(self, evaluation_history: Sequence[Any]) -> Optional[str]:
+        scores = [evaluation.overall_score for evaluation in evaluation_history if is_comparable(evaluation)]
+        if len(scores) <= self.window:
+            return None
+        best_before = max(scores[:-self.window])
+        best_recent = max(scores[-self.window:])
+        if best_recent - best_before < self.min_improvement:
+            return (f"Score plateaued: best of last {self.window} evaluation(s) improved by "
+                    f"{best_recent - best_before:.2f} (< {self.min_improvement})")
+        return None
+
+
+class RegressionPolicy(StoppingPolicy):
+    def __init__(self, max_regressions: int):
+        self.max_regressions = max_regressions
+
+    def after_evaluation(self, evaluation_history: Sequence[Any]) -> Optional[str]:
+        regressions = 0
+        best = None
+        for evaluation in evaluation_history:
+            if not is_comparable(evaluation):
+                continue
+            if best is not None and evaluation.overall_score < best:
+                regressions += 1
+            else:
+                regressions = 0
+                best = evaluation.overall_score
+        if regressions >= self.max_regressions:
+            return f"Score regressed below the best result {regressions} time(s) in a row"
+        return None
+
+
+class ConvergencePolicy(StoppingPolicy):
+    def __init__(self, similarity_threshold: float = 1.0):
+        self.similarity_threshold = similarity_threshold
+
+    def after_revision(self, current_output: str, revised_output: str) -> Optional[str]:
+        if revised_output == current_output:
+            return "Output converged"
+        if self.similarity_threshold >= 1.0:
+            return None
+        matcher = SequenceMatcher(None, current_output, revised_output, autojunk=False)
+        if matcher.real_quick_ratio() < self.similarity_threshold or \
+                matcher.quick_ratio() < self.similarity_threshold:
+            return None
+        similarity = matcher.ratio()
+        if similarity >= self.similarity_threshold:
+            return f"Output converged (similarity {similarity:.3f})"
+        return None
+
+
+class CompositeStoppingPolicy(StoppingPolicy):
+    def __init__(self, policies: List[StoppingPolicy]):
+        self.policies = policies
+
+    def after_evaluation(self, evaluation_history: Sequence[Any]) -> Optional[str]:
+        for policy in self.policies:
+            reason = policy.after_evaluation(evaluation_history)
+            if reason:
+                return reason
+        return None
+
+    def after_revision(self, current_output: str, revised_output: str) -> Optional[str]:
+        for policy in self.policies:
+            reason = policy.after_revision(current_output, revised_output)
+            if reason:
+                return reason
+        return None
+
+
+def build_stopping_policy(settings: Optional[Dict[str, Any]] = None,
+                          target_score: Optional[float] = None) -> CompositeStoppingPolicy:
+    settings = config['reviser']['stopping'] if settings is None else settings
+    policies: List[StoppingPolicy] = [
+        TargetScorePolicy(config['reviser']['target_score'] if target_score is None else target_score)
+    ]
+    if settings.get('plateau_window'):
+        policies.append(PlateauPolicy(settings['plateau_window'], settings.get('min_improvement', 0.0)))
+    if settings.get('max_regressions'):
+        policies.append(RegressionPolicy(settings['max_regressions']))
+    policies.append(ConvergencePolicy(settings.get('similarity_threshold', 1.0)))
+    return CompositeStoppingPolicy(policies)
@@ -0,0 +1,71 @@
+from typing import List
+from pydantic import BaseModel
+
+SUGGESTIONS_HEADER = 'SUGGESTIONS:'
+REVISED_OUTPUT_HEADER = 'REVISED OUTPUT:'
+REVISED_OUTPUT_END = 'END OF REVISED OUTPUT'
+
+
+class RevisionStreamEvent(BaseModel):
+    kind: str
+    text: str = ""
+
+
+class RevisionStreamParser:
+    def __init__(self):
+        self.suggestions: List[str] = []
+        self.revised_lines: List[str] = []
+        self.done = False
+        self._section = None
+        self._buffer = ""
+        self._chunks: List[str] = []
+
+    @property
+    def raw_text(self) -> str:
+        return "".join(self._chunks)
+
+    @property
+    def revised_output(self) -> str:
+        return "\n".join(self.revised_lines).strip()
+
+    def feed(self, chunk: str) -> List[RevisionStreamEvent]:
+        if self.done:
+            return []
+        self._chunks.append(chunk)
+        self._buffer += chunk
+
+        events = []
+        while not self.done and '\n' in self._buffer:
+            line, self._buffer = self._buffer.split('\n', 1)
+            events.extend(self._process_line(line))
+        return events
+
+    def close(self) -> List[RevisionStreamEvent]:
+        events = []
+        if not self.done and self._buffer:
+            events.extend(self._process_line(self._buffer))
+            self._buffer = ""
+        if not self.done:
+            self.done = True
+            events.append(RevisionStreamEvent(kind="complete", text=self.revised_output))
+        return events
+
+    def _process_line(self, line: str) -> List[RevisionStreamEvent]:
+        line = line.strip()
+        if line.startswith(REVISED_OUTPUT_HEADER):
+            self._section = 'revised_output'
+            return []
+        elif line.startswith(SUGGESTIONS_HEADER):
+            self._section = 'suggestions'
+            return []
+
+        if self._section == 'suggestions':
+            self.suggestions.append(line)
+            return [RevisionStreamEvent(kind="suggestion", text=line)] if line else []
+        elif self._section == 'revised_output':
+            if line.startswith(REVISED_OUTPUT_END):
+                self.done = True
+                return [RevisionStreamEvent(kind="complete", text=self.revised_output)]
+            self.revised_lines.append(line)
+            return [RevisionStreamEvent(kind="revised_output", text=line + '\n')]
+        return []
@@ -0,0 +1,85 @@
+import json
+import logging
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from instrumentation import instrumentation
+
+logger = logging.getLogger(__name__)
+
+M = TypeVar('M', bound=BaseModel)
+
+_CODE_FENCE = re.compile(r'^```(?:json)?\s*\n?(.*?)\n?```\s*$', re.DOTALL)
+
+
+class ParseOutcome(BaseModel):
+    result: Optional[Any] = None
+    valid: Dict[str, Any] = {}
+    malformed: List[str] = []
+    error: str = ""
+
+
+def extract_json_object(text: str) -> Dict[str, Any]:
+    text = text.strip()
+    fenced = _CODE_FENCE.match(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        # Models outside JSON mode tend to wrap the object in a sentence or two
+        start, end = text.find('{'), text.rfind('}')
+        if start == -1 or end <= start:
+            raise ValueError("response contains no JSON object")
+        try:
+            data = json.loads(text[start:end + 1])
+        except json.JSONDecodeError as e:
+            raise ValueError(f"response is not valid JSON ({e.msg})")
+    if not isinstance(data, dict):
+        raise ValueError("response is not a JSON object")
+    return data
+
+
+def required_fields(model: Type[BaseModel]) -> List[str]:
+    return [name for name, field in model.model_fields.items() if field.is_required()]
+
+
+def parse_structured(text: str, model: Type[M], valid: Optional[Dict[str, Any]] = None) -> ParseOutcome:
+    # Fields that validated in an earlier reply are kept, so a re-ask only has to get the malformed ones right
+    try:
+        data = {**(valid or {}), **extract_json_object(text)}
+    except ValueError as e:
+        missing = [name for name in required_fields(model) if name not in (valid or {})]
+        return ParseOutcome(valid=valid or {}, malformed=missing or required_fields(model), error=str(e))
+
+    try:
+        return ParseOutcome(result=model.model_validate(data))
+    except ValidationError as e:
+        malformed = sorted({str(error['loc'][0]) for error in e.errors() if error['loc']}) or required_fields(model)
+        kept = {name: value for name, value in data.items() if name in model.model_fields and name not in malformed}
+        error = "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors())
+        return ParseOutcome(valid=kept, malformed=malformed, error=error)
+
+
+async def parse_with_reasks(text: str,
+                            model: Type[BaseModel],
+                            reask: Callable[[str, List[str], str], Awaitable[str]],
+                            max_reasks: int,
+                            stage: str,
+                            model_name: str = "") -> ParseOutcome:
+    valid: Dict[str, Any] = {}
+    for attempt in range(max_reasks + 1):
+        with instrumentation.span(f"parse_{stage}", model_name) as span:
+            outcome = parse_structured(text, model, valid)
+            if outcome.result is None:
+                span.parse_failures += 1
+        if outcome.result is not None or attempt == max_reasks:
+            break
+        valid = outcome.valid
+        logger.warning(f"Malformed {stage} response ({outcome.error}); re-asking for {', '.join(outcome.malformed)}")
+        text = await reask(text, outcome.malformed, outcome.error)
+    if outcome.result is None:
+        logger.warning(f"Malformed {stage} response after {max_reasks} re-asks ({outcome.error})")
+    return outcome
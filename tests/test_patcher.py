@@ -0,0 +1,25 @@
+import pytest
+
+from patcher import PatchError, apply_edits, parse_patch_result
+
+
+def test_parses_edit_blocks():
+    suggestions, edits = parse_patch_result(
+        "SUGGESTIONS:\nTighten the intro\n\nEDITS:\n<<< MODIFY\nold line\n===\nnew line\n>>>\nEND OF EDITS"
+    )
+    assert suggestions == ["Tighten the intro"]
+    assert apply_edits("old line\nrest", edits) == "new line\nrest"
+
+
+def test_rejects_edits_without_blocks():
+    with pytest.raises(PatchError):
+        parse_patch_result("SUGGESTIONS:\nTighten the intro\n\nEDITS:\nMODIFY: old line -> new line\nEND OF EDITS")
+
+
+def test_rejects_empty_edits_with_suggestions():
+    with pytest.raises(PatchError):
+        parse_patch_result("SUGGESTIONS:\nTighten the intro\n\nEDITS:\nEND OF EDITS")
+
+
+def test_allows_empty_edits_without_suggestions():
+    assert parse_patch_result("EDITS:\nEND OF EDITS") == ([], [])
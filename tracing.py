@@ -1,3 +1,5 @@
+import functools
+import inspect
 import os
 import logging
 from typing import Protocol, runtime_checkable
@@ -50,4 +52,40 @@ def get_openai_client(api_key: str):
     return None
 
 
-tracer = get_tracer()
+class LazyTracer:
+    def __init__(self):
+        self._tracer = None
+
+    def resolve(self):
+        if self._tracer is None:
+            self._tracer = get_tracer()
+        return self._tracer
+
+    def __call__(self, **kwargs):
+        # LangSmith is only probed the first time a traced function actually runs
+        def decorator(func):
+            traced = None
+
+            def resolve():
+                nonlocal traced
+                if traced is None:
+                    traced = self.resolve()(**kwargs)(func)
+                return traced
+
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kw):
+                    return await resolve()(*args, **kw)
+
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kw):
+                return resolve()(*args, **kw)
+
+            return wrapper
+
+        return decorator
+
+
+tracer = LazyTracer()